@@ -0,0 +1,239 @@
+"""Benchmarks of the loan math and the storage paths.
+
+Times the mortgage calculations at growing numbers of parts and rate types, and saving and loading
+tables of growing size through common.storage against an in-process S3 stand-in (moto) or the
+local backend. Results are written as JSON and compared with a baseline saved next to this
+file. Timings only compare on the same machine, so the baseline is not committed: save it locally
+on the reference commit, then run the change. The moto storage cases need requirements-dev.txt.
+
+    python benchmarks/bench.py --save-baseline         # on the reference commit
+    python benchmarks/bench.py --fail-on-regression    # on the change
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append('./')
+from common import loan_calc, monte_carlo
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+BENCH_BUCKET = 'expensense-bench'
+# (parts, rate types) of the optimizer cases, the last ones only without --quick
+OPTIMIZER_SIZES = [(3, 4), (4, 6), (5, 8), (6, 8)]
+TABLE_ROWS = [1_000, 10_000, 100_000]
+
+
+def measure(fn, repeat=5, min_time=0.05):
+    """Seconds per call of fn: calls are batched until a batch takes min_time, then repeat batches are timed."""
+    fn()  # Warm up caches and lazy imports
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return {'median': statistics.median(times), 'min': min(times), 'number': number, 'repeat': repeat}
+
+
+def bench_setup(n_parts, n_rates):
+    """A LoanSetup of n_parts equal parts and a float rate plus n_rates - 1 fixed terms of 1, 2, ... years."""
+    defaults = loan_calc.LoanSetup.from_config()
+    rates = [('float', defaults.float_rate)] + [(f'fixed_{years}_year', 4.6 - 0.1 * years) for years in range(1, n_rates)]
+    return defaults._replace(principals=(8_000_000 / n_parts,) * n_parts, base_rates=tuple(rates))
+
+
+def loan_cases(quick):
+    """(name, function) of the loan math benchmarks."""
+    setup = loan_calc.LoanSetup.from_config()
+    adjustment = loan_calc.RateAdjustment()
+    split = [('float', setup.float_rate, True), ('fixed_1_year', 4.54, False), ('fixed_3_year', 4.0, False)]
+    cases = [
+        ('compute_interest', lambda: loan_calc.compute_interest(3_000_000, 4.65)),
+        ('simulate_scenario', lambda: loan_calc.simulate_scenario(setup, split, adjustment)),
+        ('plan_refixing', lambda: loan_calc.plan_refixing(setup, adjustment)),
+    ]
+    for duration in (24, 120) if quick else (24, 120, 360):
+        cases.append((f'compute_rates_over_time[months={duration}]',
+                      lambda duration=duration: loan_calc.compute_rates_over_time('float', 4.65, duration, 3.0, 0.25)))
+    for n_parts, n_rates in OPTIMIZER_SIZES[:2] if quick else OPTIMIZER_SIZES:
+        sized = bench_setup(n_parts, n_rates)
+        _, values = sized.rate_table()
+        label = f'parts={n_parts},rates={n_rates}'
+        cases += [
+            (f'compute_combination_interests[{label}]',
+             lambda sized=sized, values=values: loan_calc.compute_combination_interests(sized.principals, values, sized.discount)),
+            (f'best_monthly_splits[{label}]', lambda sized=sized: loan_calc.best_monthly_splits(sized, 10)),
+            (f'best_adjusted_splits[{label}]', lambda sized=sized: loan_calc.best_adjusted_splits(sized, adjustment, 10)),
+        ]
+    stochastic = monte_carlo.StochasticRates(n_paths=1000 if quick else 10000)
+    codes, discounted = loan_calc.enumerate_discount_scenarios(len(setup.principals), len(setup.base_rates))
+    cases.append((f'evaluate_splits[paths={stochastic.n_paths}]',
+                  lambda: monte_carlo.evaluate_splits(setup, adjustment, stochastic, codes, discounted)))
+    return cases
+
+
+def start_storage(kind, workdir):
+    """Point common.storage at the requested stand-in and return the bucket to use, None to skip storage cases."""
+    if kind == 'none':
+        return None
+    from common.config import storage_params
+    if kind == 'local':
+        os.environ['EXPENSENSE_STORAGE'] = 'local'
+        storage_params.local_root = os.path.join(workdir, 'data')
+        return BENCH_BUCKET
+    if kind in ('moto', 'moto-cached'):
+        from moto import mock_aws
+        mock_aws().start()
+        for name, value in (('AWS_ACCESS_KEY_ID', 'bench'), ('AWS_SECRET_ACCESS_KEY', 'bench'), ('AWS_DEFAULT_REGION', 'us-east-1')):
+            os.environ.setdefault(name, value)
+    os.environ['EXPENSENSE_STORAGE'] = 'cached_s3' if kind == 'moto-cached' else 's3'
+    storage_params.cache_dir = os.path.join(workdir, 'cache')
+    from common import storage
+    client = storage.get_s3_client()
+    if BENCH_BUCKET not in [bucket['Name'] for bucket in client.list_buckets()['Buckets']]:
+        client.create_bucket(Bucket=BENCH_BUCKET)
+    return BENCH_BUCKET
+
+
+def bench_table(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.integers(0, 100_000, (rows, 6)), columns=[f'amount_{idx}' for idx in range(6)])
+    df['category'] = rng.choice(['rent', 'food', 'salary', 'bonus'], rows)
+    return df
+
+
+def storage_cases(bucket, quick):
+    """(name, function) of the save and load benchmarks, cold loads starting from an empty DataFrame cache."""
+    from streamlit import config
+
+    from common import storage
+
+    # Storage runs outside `streamlit run`, without a script context to draw its messages on
+    config.set_option('global.showWarningOnDirectExecution', False)
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith('streamlit'):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+    def cold_load(key):
+        storage.get_df_cache()[0].clear()
+        return storage.load_df_from_s3(bucket, key)
+
+    cases = []
+    for rows in TABLE_ROWS[:2] if quick else TABLE_ROWS:
+        df = bench_table(rows)
+        for extension in ('parquet', 'csv'):
+            key = f'bench_{rows}.{extension}'
+            storage.save_df_to_s3(df, bucket, key)  # So the load cases also run on their own with --filter
+            cases += [
+                (f'save_df_to_s3[{extension},rows={rows}]', lambda df=df, key=key: storage.save_df_to_s3(df, bucket, key)),
+                (f'load_df_from_s3[{extension},rows={rows},cold]', lambda key=key: cold_load(key)),
+                (f'load_df_from_s3[{extension},rows={rows},cached]', lambda key=key: storage.load_df_from_s3(bucket, key)),
+            ]
+    return cases
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print every case next to its baseline and return the names of those slower by more than tolerance.
+
+    Best times are compared, they are much less sensitive to other load on the machine than medians.
+    """
+    regressions = []
+    print(f"{'case':<58} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<58} {'-':>12} {result['min'] * 1e3:>10.3f}ms {'new':>7}")
+            continue
+        ratio = result['min'] / before['min']
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<58} {before['min'] * 1e3:>10.3f}ms {result['min'] * 1e3:>10.3f}ms {ratio:>7.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--storage', choices=['moto', 'moto-cached', 's3', 'local', 'none'], default='local',
+                        help="Where the storage cases run: in-process moto, moto behind the disk cache tier, the S3 "
+                             "endpoint of the AWS_* environment variables (e.g. a moto server), a local directory, or nowhere")
+    parser.add_argument('--filter', default='', help="Only run cases whose name contains this")
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes and fewer repeats")
+    parser.add_argument('--repeat', type=int, default=None, help="Timed batches per case, 5 by default and 3 with --quick")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Slowdown over the baseline reported as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    repeat = args.repeat or (3 if args.quick else 5)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = loan_cases(args.quick)
+        bucket = start_storage(args.storage, workdir)
+        if bucket is not None:
+            cases += storage_cases(bucket, args.quick)
+        results = {}
+        for name, fn in cases:
+            if args.filter in name:
+                results[name] = measure(fn, repeat)
+                print(f"{name:<58} {results[name]['median'] * 1e3:>10.3f}ms", flush=True)
+
+    report = {
+        'meta': {'revision': git_revision(), 'python': platform.python_version(), 'platform': platform.platform(),
+                 'numpy': np.__version__, 'pandas': pd.__version__, 'storage': args.storage, 'quick': args.quick},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {args.baseline} (revision {baseline['meta'].get('revision')})")
+    if baseline['meta'].get('storage') != args.storage:
+        print(f"The baseline ran its storage cases on {baseline['meta'].get('storage')}, these ran on {args.storage}")
+    regressions = compare(results, baseline['results'], args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {args.tolerance:.0%}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,465 @@
+"""Storage backends behind common.storage.
+
+A backend stores byte objects by key in one bucket. S3Backend talks to S3, or to any endpoint
+speaking its API such as a moto server; LocalBackend keeps the objects as files in a directory so
+the app runs offline; CachedBackend puts a size-bounded local disk tier in front of another
+backend, writing through it and serving reads from disk while the remote copy is unchanged.
+Backends know nothing about DataFrames or Streamlit.
+"""
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from botocore.exceptions import ClientError
+from botocore.exceptions import ConnectionError as BotoConnectionError
+
+from common import tracing
+
+# Uploads larger than this go up as multipart uploads of PART_SIZE parts, UPLOAD_WORKERS at a time
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+PART_SIZE = 8 * 1024 * 1024
+UPLOAD_WORKERS = 4
+# Bytes copied at a time between streams and files
+COPY_CHUNK = 1024 * 1024
+
+
+class ObjectInfo(NamedTuple):
+    key: str
+    size: int
+    etag: str
+    last_modified: datetime
+
+
+class StoredObject(NamedTuple):
+    """An object being read: a binary file-like body, its ETag and Content-Encoding."""
+    body: object
+    etag: str
+    content_encoding: str = None
+
+
+class NoSuchKey(KeyError):
+    pass
+
+
+class NotModified(Exception):
+    """The object still has the ETag given as if_none_match."""
+
+
+class PreconditionFailed(Exception):
+    """A conditional put found the object changed (if_match) or already there (if_none_match='*')."""
+
+
+class StorageBackend:
+    """Objects of one bucket, by key."""
+
+    def get(self, key, if_none_match=None):
+        """The object as a StoredObject; raises NoSuchKey, or NotModified if its ETag is if_none_match."""
+        raise NotImplementedError
+
+    def put(self, key, chunks, content_type=None, content_encoding=None, if_match=None, if_none_match=None):
+        """Store the concatenated byte chunks and return (ETag, size, body).
+
+        body is the bytes written when they were few enough to keep (up to MULTIPART_THRESHOLD),
+        None otherwise. With if_match the object must still have that ETag, with if_none_match='*'
+        it must not exist yet, or PreconditionFailed is raised.
+        """
+        raise NotImplementedError
+
+    def list(self, prefix='', delimiter='/', start_after=''):
+        """Yield ObjectInfo of the objects under the prefix sorted by key, after start_after.
+
+        With a delimiter, keys having it again after the prefix (like the table journals) are skipped.
+        """
+        raise NotImplementedError
+
+    def delete(self, keys):
+        raise NotImplementedError
+
+
+def _parts(chunks, part_size=PART_SIZE):
+    """Regroup a stream of byte chunks into parts of part_size bytes, the last one shorter."""
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= part_size:
+            yield bytes(buffer[:part_size])
+            del buffer[:part_size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def _put_conditions(if_match, if_none_match):
+    conditions = {}
+    if if_match:
+        conditions['IfMatch'] = if_match
+    if if_none_match:
+        conditions['IfNoneMatch'] = if_none_match
+    return conditions
+
+
+class S3Backend(StorageBackend):
+    """A bucket on S3, through a shared client; multipart upload parts are sent on the executor."""
+
+    def __init__(self, client, bucket_name, executor):
+        self.client = client
+        self.bucket_name = bucket_name
+        self.executor = executor
+
+    def get(self, key, if_none_match=None):
+        conditions = {'IfNoneMatch': if_none_match} if if_none_match else {}
+        tracing.count('s3.calls')
+        try:
+            with tracing.span('s3.get_object', key=key):
+                obj = self.client.get_object(Bucket=self.bucket_name, Key=key, **conditions)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code in ('304', 'NotModified'):
+                raise NotModified(key) from e
+            if code == 'NoSuchKey':
+                raise NoSuchKey(key) from e
+            raise
+        tracing.count('s3.bytes_read', obj.get('ContentLength', 0))
+        return StoredObject(obj['Body'], obj.get('ETag'), obj.get('ContentEncoding'))
+
+    def put(self, key, chunks, content_type=None, content_encoding=None, if_match=None, if_none_match=None):
+        """Up to MULTIPART_THRESHOLD the body is sent with one put_object; beyond, it becomes a
+        multipart upload whose parts are sent in parallel, with at most UPLOAD_WORKERS of them in
+        flight, so memory does not grow with the size of the upload."""
+        extra_args = {}
+        if content_type:
+            extra_args['ContentType'] = content_type
+        if content_encoding:
+            extra_args['ContentEncoding'] = content_encoding
+        conditions = _put_conditions(if_match, if_none_match)
+        try:
+            with tracing.span('s3.put', key=key):
+                etag, size, body = self._upload(key, chunks, extra_args, conditions)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            # S3 answers an If-Match on a key that is gone with NoSuchKey
+            if code in ('PreconditionFailed', 'ConditionalRequestConflict') or (if_match and code == 'NoSuchKey'):
+                raise PreconditionFailed(key) from e
+            raise
+        tracing.count('s3.bytes_written', size)
+        return etag, size, body
+
+    def _upload(self, key, chunks, extra_args, conditions):
+        parts = _parts(chunks, max(PART_SIZE, 5 * 1024 * 1024))
+        head = []
+        for part in parts:
+            head.append(part)
+            if sum(map(len, head)) > MULTIPART_THRESHOLD:
+                break
+        else:
+            body = b''.join(head)
+            tracing.count('s3.calls')
+            response = self.client.put_object(Body=body, Bucket=self.bucket_name, Key=key, **extra_args, **conditions)
+            return response.get('ETag'), len(body), body
+
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket_name, Key=key, **extra_args)['UploadId']
+        upload_part = tracing.traced('s3.upload_part')(self.client.upload_part)
+        pending, etags, size = {}, {}, 0
+        try:
+            for number, part in enumerate(itertools.chain(head, parts), start=1):
+                if len(pending) >= UPLOAD_WORKERS:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        etags[pending.pop(future)] = future.result()['ETag']
+                size += len(part)
+                future = self.executor.submit(tracing.bind(upload_part), Bucket=self.bucket_name, Key=key,
+                                              UploadId=upload_id, PartNumber=number, Body=part)
+                pending[future] = number
+            tracing.count('s3.calls', number + 2)  # Parts, create and complete
+            for future in pending:
+                etags[pending[future]] = future.result()['ETag']
+            response = self.client.complete_multipart_upload(
+                Bucket=self.bucket_name, Key=key, UploadId=upload_id,
+                MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': etag} for number, etag in sorted(etags.items())]},
+                **conditions)
+        except Exception:
+            self.client.abort_multipart_upload(Bucket=self.bucket_name, Key=key, UploadId=upload_id)
+            raise
+        return response.get('ETag'), size, None
+
+    def list(self, prefix='', delimiter='/', start_after=''):
+        """Pages are fetched lazily and the prefix, delimiter and start_after are applied by S3 itself."""
+        params = {'Bucket': self.bucket_name, 'Prefix': prefix}
+        if delimiter:
+            params['Delimiter'] = delimiter
+        if start_after:
+            params['StartAfter'] = start_after
+        pages = iter(self.client.get_paginator('list_objects_v2').paginate(**params))
+        while True:
+            with tracing.span('s3.list_objects', prefix=prefix):
+                page = next(pages, None)
+            if page is None:
+                return
+            tracing.count('s3.calls')
+            for obj in page.get('Contents', []):
+                yield ObjectInfo(obj['Key'], obj['Size'], obj['ETag'], obj['LastModified'])
+
+    def delete(self, keys):
+        keys = list(keys)
+        for start in range(0, len(keys), 1000):
+            tracing.count('s3.calls')
+            with tracing.span('s3.delete_objects', keys=len(keys[start:start + 1000])):
+                self.client.delete_objects(Bucket=self.bucket_name,
+                                           Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]],
+                                                   'Quiet': True})
+
+
+def _write_atomically(path, chunks):
+    """Write the chunks to a temporary file next to path, then move it in place.
+
+    Returns (MD5 hex digest, size, body), body being kept only up to MULTIPART_THRESHOLD bytes.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    digest, size, kept = hashlib.md5(), 0, []
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+                if kept is not None:
+                    kept.append(chunk)
+                    if size > MULTIPART_THRESHOLD:
+                        kept = None
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return digest.hexdigest(), size, None if kept is None else b''.join(kept)
+
+
+class LocalBackend(StorageBackend):
+    """A bucket kept as files under a root directory, keys being paths relative to it.
+
+    The ETag and Content-Encoding of each object are kept in a JSON sidecar under .meta/; files
+    copied in by hand get an ETag from their modification time and size.
+    """
+    META_DIR = '.meta'
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        parts = key.split('/')
+        if not key or any(part in ('', '.', '..') for part in parts) or parts[0] == self.META_DIR:
+            raise ValueError(f"Invalid key {key!r}")
+        return os.path.join(self.root, *parts)
+
+    def _meta_path(self, key):
+        return os.path.join(self.root, self.META_DIR, *key.split('/')) + '.json'
+
+    def _meta(self, key, stat):
+        try:
+            with open(self._meta_path(key)) as f:
+                meta = json.load(f)
+            if meta.get('mtime_ns') == stat.st_mtime_ns:
+                return meta
+        except (OSError, ValueError):
+            pass
+        return {'etag': f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'}
+
+    def get(self, key, if_none_match=None):
+        path = self._path(key)
+        try:
+            body = open(path, 'rb')
+        except FileNotFoundError:
+            raise NoSuchKey(key) from None
+        meta = self._meta(key, os.fstat(body.fileno()))
+        if if_none_match and if_none_match == meta['etag']:
+            body.close()
+            raise NotModified(key)
+        return StoredObject(body, meta['etag'], meta.get('content_encoding'))
+
+    def put(self, key, chunks, content_type=None, content_encoding=None, if_match=None, if_none_match=None):
+        path = self._path(key)
+        with self.lock:
+            if if_match or if_none_match:
+                try:
+                    current = self._meta(key, os.stat(path))['etag']
+                except FileNotFoundError:
+                    current = None
+                if (if_match and current != if_match) or (if_none_match == '*' and current is not None):
+                    raise PreconditionFailed(key)
+            md5, size, body = _write_atomically(path, chunks)
+            etag = f'"{md5}"'
+            meta = {'etag': etag, 'content_encoding': content_encoding, 'mtime_ns': os.stat(path).st_mtime_ns}
+            _write_atomically(self._meta_path(key), [json.dumps(meta).encode('utf-8')])
+        return etag, size, body
+
+    def list(self, prefix='', delimiter='/', start_after=''):
+        directory, _, _ = prefix.rpartition('/')
+        base = os.path.join(self.root, *directory.split('/')) if directory else self.root
+        keys = []
+        for dirpath, dirnames, filenames in os.walk(base):
+            relative = os.path.relpath(dirpath, self.root).replace(os.sep, '/')
+            relative = '' if relative == '.' else relative + '/'
+            dirnames[:] = [] if delimiter else [name for name in dirnames if relative or name != self.META_DIR]
+            keys.extend(relative + name for name in filenames if not name.startswith('.tmp-'))
+        for key in sorted(keys):
+            if not key.startswith(prefix) or key <= start_after:
+                continue
+            if delimiter and delimiter in key[len(prefix):]:
+                continue
+            try:
+                stat = os.stat(self._path(key))
+            except FileNotFoundError:
+                continue
+            yield ObjectInfo(key, stat.st_size, self._meta(key, stat)['etag'],
+                             datetime.fromtimestamp(stat.st_mtime, timezone.utc))
+
+    def delete(self, keys):
+        for key in keys:
+            for path in (self._path(key), self._meta_path(key)):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+
+class CachedBackend(StorageBackend):
+    """A local disk tier in front of a remote backend.
+
+    Writes go to the remote and are kept on disk; reads revalidate the disk copy with a conditional
+    get, or skip the remote entirely when it was validated less than max_age seconds ago, and fall
+    back to the disk copy when the remote cannot be reached. The least recently used files are
+    evicted once the tier holds more than max_bytes.
+    """
+
+    def __init__(self, remote, cache_dir, max_bytes, max_age=0):
+        self.remote = remote
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+    def _paths(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, name), os.path.join(self.cache_dir, name + '.json')
+
+    def _entry(self, key):
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('key') == key and os.path.exists(data_path) else None
+
+    def _serve(self, key, meta, if_none_match):
+        if if_none_match and if_none_match == meta['etag']:
+            raise NotModified(key)
+        data_path, _ = self._paths(key)
+        os.utime(data_path)  # Most recently used
+        return StoredObject(open(data_path, 'rb'), meta['etag'], meta.get('content_encoding'))
+
+    def _store(self, key, chunks, etag, content_encoding):
+        _write_atomically(self._paths(key)[0], chunks)
+        self._validated(key, etag, content_encoding)
+        self._evict()
+
+    def _validated(self, key, etag, content_encoding):
+        _, meta_path = self._paths(key)
+        meta = {'key': key, 'etag': etag, 'content_encoding': content_encoding, 'validated': time.time()}
+        _write_atomically(meta_path, [json.dumps(meta).encode('utf-8')])
+
+    def _drop(self, key):
+        for path in self._paths(key):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        with self.lock:
+            files = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and not entry.name.endswith('.json') and not entry.name.startswith('.tmp-'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                for stale in (path, path + '.json'):
+                    try:
+                        os.unlink(stale)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+    def get(self, key, if_none_match=None):
+        meta = self._entry(key)
+        if meta is not None and time.time() - meta['validated'] <= self.max_age:
+            tracing.count('cache.hits')
+            return self._serve(key, meta, if_none_match)
+        try:
+            obj = self.remote.get(key, if_none_match=meta['etag'] if meta else if_none_match)
+        except NotModified:
+            if meta is None:
+                raise
+            tracing.count('cache.hits')
+            self._validated(key, meta['etag'], meta.get('content_encoding'))
+            return self._serve(key, meta, if_none_match)
+        except NoSuchKey:
+            self._drop(key)
+            raise
+        except BotoConnectionError:
+            if meta is None:
+                raise
+            tracing.count('cache.stale_hits')
+            return self._serve(key, meta, if_none_match)  # Offline, the last copy seen is the best we have
+        tracing.count('cache.misses')
+        body = obj.body
+        chunks = iter(lambda: body.read(COPY_CHUNK), b'')
+        self._store(key, chunks, obj.etag, obj.content_encoding)
+        meta = self._entry(key)
+        if meta is None:  # Evicted right away, larger than the whole tier
+            return self.remote.get(key, if_none_match=if_none_match)
+        return self._serve(key, meta, if_none_match)
+
+    def put(self, key, chunks, content_type=None, content_encoding=None, if_match=None, if_none_match=None):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp-')
+        f = os.fdopen(fd, 'wb')
+
+        def tee(chunks):
+            for chunk in chunks:
+                f.write(chunk)
+                yield chunk
+
+        try:
+            etag, size, body = self.remote.put(key, tee(chunks), content_type, content_encoding, if_match, if_none_match)
+            f.close()
+            os.replace(tmp_path, self._paths(key)[0])
+            self._validated(key, etag, content_encoding)
+            self._evict()
+        except Exception:
+            self._drop(key)
+            raise
+        finally:
+            f.close()
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return etag, size, body
+
+    def list(self, prefix='', delimiter='/', start_after=''):
+        return self.remote.list(prefix, delimiter, start_after)
+
+    def delete(self, keys):
+        keys = list(keys)
+        self.remote.delete(keys)
+        for key in keys:
+            self._drop(key)
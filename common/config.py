@@ -7,4 +7,15 @@ class loan_params:
 
     principal_part1 = 3000000
     principal_part2 = 2692309
-    principal_part3 = 2692309
\ No newline at end of file
+    principal_part3 = 2692309
+
+class storage_params:
+    # 's3', 'cached_s3' (S3 behind a local disk cache) or 'local' (files under local_root, offline)
+    backend = 'cached_s3'
+    bucket_name = 'streamlitbucketkamra34'
+
+    local_root = './data'
+    cache_dir = './.s3_cache'
+    cache_max_bytes = 512 * 1024 * 1024
+    # Seconds a cached file is served without asking S3 whether it changed
+    cache_max_age = 0
@@ -0,0 +1,97 @@
+"""Background computations shared by every session.
+
+A job is identified by a fingerprint of its inputs: sessions asking for the same fingerprint share
+one job and its result, and the results of the last JOB_CACHE_SIZE jobs are kept, so going back to
+earlier inputs costs nothing. Each session watches at most one job per slot (a section of a page);
+watching a new one releases the previous, which is cancelled if it has not started yet and no other
+session watches it. Streamlit does not say when a session ends, so the slots of a session that has
+not watched anything for WATCHER_TTL seconds are released as if it had.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from common import tracing
+
+# Jobs running at once; further jobs queue until a worker is free
+JOB_WORKERS = 2
+# Finished jobs kept for reuse
+JOB_CACHE_SIZE = 16
+# Seconds after its last watch that a session is taken to be gone and its slots are released
+WATCHER_TTL = 3600
+
+
+def fingerprint(*inputs):
+    """Short stable digest of the inputs, which must have a repr that identifies them (NamedTuples, tuples, numbers)."""
+    return hashlib.sha1(repr(inputs).encode('utf-8')).hexdigest()[:16]
+
+
+class JobBoard:
+    """Futures by fingerprint, started on a thread pool of its own, with who is waiting for them."""
+
+    def __init__(self, workers=JOB_WORKERS, cache_size=JOB_CACHE_SIZE, watcher_ttl=WATCHER_TTL):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+        self.cache_size = cache_size
+        self.watcher_ttl = watcher_ttl
+        self.jobs = OrderedDict()
+        self.watchers = defaultdict(set)
+        self.watching = {}
+        self.last_seen = {}
+        self.lock = threading.Lock()
+
+    def watch(self, watcher, slot, key, fn, *args):
+        """Future of fn(*args) for the fingerprint key, started unless a job for it exists already.
+
+        The watcher's previous job in the slot is released. A job that failed is started again.
+        """
+        with self.lock:
+            self._forget_idle(watcher)
+            previous = self.watching.get((watcher, slot))
+            if previous != key:
+                self.watching[(watcher, slot)] = key
+                if previous is not None:
+                    self._release(previous, watcher)
+            future = self.jobs.get(key)
+            if future is None or future.cancelled() or (future.done() and future.exception() is not None):
+                tracing.count('jobs.started')
+                future = self.executor.submit(tracing.bind(fn), *args)
+                self.jobs[key] = future
+            else:
+                tracing.count('jobs.shared')
+            self.jobs.move_to_end(key)
+            self.watchers[key].add(watcher)
+            self._evict()
+            return future
+
+    def _forget_idle(self, watcher):
+        """Release every slot of the watchers other than this one that have not watched for watcher_ttl."""
+        now = time.monotonic()
+        self.last_seen[watcher] = now
+        idle = {other for other, seen in self.last_seen.items() if now - seen > self.watcher_ttl and other != watcher}
+        if not idle:
+            return
+        for (other, slot), key in list(self.watching.items()):
+            if other in idle:
+                del self.watching[(other, slot)]
+                self._release(key, other)
+        for other in idle:
+            del self.last_seen[other]
+
+    def _release(self, key, watcher):
+        watchers = self.watchers.get(key, set())
+        watchers.discard(watcher)
+        if watchers:
+            return
+        self.watchers.pop(key, None)
+        future = self.jobs.get(key)
+        if future is not None and future.cancel():
+            tracing.count('jobs.cancelled')
+            del self.jobs[key]
+
+    def _evict(self):
+        """Forget the least recently watched finished jobs beyond cache_size; running ones stay."""
+        excess = len(self.jobs) - self.cache_size
+        for key in [key for key, future in self.jobs.items() if future.done()][:max(excess, 0)]:
+            del self.jobs[key]
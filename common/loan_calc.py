@@ -0,0 +1,405 @@
+"""Mortgage calculations shared by the Streamlit pages and the headless tools.
+
+Nothing in here imports Streamlit: every input is passed explicitly, so the functions can be
+called from scripts, benchmarked, or pickled to worker processes.
+"""
+import functools
+from typing import NamedTuple
+
+import numpy as np
+
+from common.config import loan_params
+
+
+class LoanSetup(NamedTuple):
+    """Principals of the mortgage parts, the offered (rate type, rate) pairs and the discount.
+
+    amort_rates holds the yearly amortization of every part in % of its principal; when empty,
+    interest is charged on the full principal for the whole horizon.
+    """
+    principals: tuple
+    base_rates: tuple
+    discount: float
+    amort_rates: tuple = ()
+
+    @classmethod
+    def from_config(cls, params=loan_params):
+        return cls(
+            principals=(params.principal_part1, params.principal_part2, params.principal_part3),
+            base_rates=(('float', params.init_float_val), ('fixed_1_year', params.init_1_year_val),
+                        ('fixed_2_year', params.init_2_year_val), ('fixed_3_year', params.init_3_year_val)),
+            discount=params.discount_val,
+        )
+
+    @property
+    def float_rate(self):
+        return dict(self.base_rates)['float']
+
+    def average_balances(self, months):
+        """Average outstanding balance of every part over the first months."""
+        if not self.amort_rates or not months:
+            return np.asarray(self.principals, dtype=float)
+        return amortized_balances(self.principals, self.amort_rates, months).mean(axis=1)
+
+    def rate_table(self, rate_names=None):
+        """Names and rates of the selected rate types, all of them by default."""
+        rates = dict(self.base_rates)
+        names = list(rates) if rate_names is None else list(rate_names)
+        return np.array(names, dtype=str), np.array([rates[name] for name in names], dtype=float)
+
+
+class RateAdjustment(NamedTuple):
+    """Quarterly float-rate decrement, the float floor and the simulated horizon in months."""
+    monthly_dec: float = 0.25
+    final_float_rate: float = 3.0
+    duration: int = 24
+
+
+########################################################################################
+###############################        PART 1           ################################
+########################################################################################
+def compute_interest(P, r):
+    yearly_interest = (P * (r/100))
+    monthly_interest = yearly_interest/12
+    return monthly_interest
+
+
+########################################################################################
+###############################        PART 2           ################################
+########################################################################################
+# Function to calculate the monthly interest
+def compute_monthly_interest(amount, rate):
+    return amount * (rate / 100) / 12
+
+def compute_combination_interests(mortgage_parts, rates, discount):
+    """Monthly interest of every rate combination, with the discount applied to each part in turn.
+
+    Scenario ``combo * len(mortgage_parts) + i`` is combination ``combo`` of
+    itertools.product(rates, repeat=len(mortgage_parts)) with the discount on part ``i``.
+    """
+    amounts = np.asarray(mortgage_parts, dtype=float)
+    part_costs = compute_monthly_interest(amounts[:, None], np.asarray(rates, dtype=float)[None, :])
+    # Outer sum over the parts gives one total per combination, in itertools.product order
+    combination_totals = functools.reduce(np.add.outer, part_costs).ravel()
+    discount_savings = compute_monthly_interest(amounts, discount)
+    return (combination_totals[:, None] - discount_savings[None, :]).ravel()
+
+def enumerate_discount_scenarios(n_parts, n_rates):
+    """Rate codes and discount flags (scenarios x parts) in compute_combination_interests order."""
+    codes = np.indices((n_rates,) * n_parts).reshape(n_parts, -1).T
+    codes = np.repeat(codes, n_parts, axis=0)
+    discounted = np.tile(np.eye(n_parts, dtype=bool), (len(codes) // n_parts, 1))
+    return codes, discounted
+
+def combination_index(codes, n_rates, discounted_part):
+    """Scenario index in compute_combination_interests order of a split given by its rate codes."""
+    combo = 0
+    for code in codes:
+        combo = combo * n_rates + int(code)
+    return combo * len(codes) + int(discounted_part)
+
+def describe_split(codes, discounted_part, rate_names, rates, discount):
+    """Build the scenario label of a split given by its rate codes and discounted part."""
+    return ", ".join(
+        f"Part {idx+1}: {rate_names[code]} @ {rates[code] - discount if idx == discounted_part else rates[code]:.2f}%"
+        for idx, code in enumerate(codes)
+    )
+
+def describe_combination(index, n_parts, rate_names, rates, discount):
+    """Build the scenario label for one index returned by compute_combination_interests."""
+    combo, discounted_part = divmod(int(index), n_parts)
+    codes = []
+    for _ in range(n_parts):
+        combo, code = divmod(combo, len(rates))
+        codes.append(code)
+    return describe_split(codes[::-1], discounted_part, rate_names, rates, discount)
+
+
+########################################################################################
+###############################        PART 3           ################################
+########################################################################################
+def calculate_interest_payment(amount, rate, months):
+        """Calculate the interest payment over a given number of months."""
+        return amount * (rate / 100) / 12 * months
+
+def float_rate_at(initial_rate, quarter, final_float_rate, monthly_dec):
+    """Float rate after a number of quarterly adjustments, the closed form of compute_rates_over_time.
+
+    The rate moves by monthly_dec per quarter and is clamped at final_float_rate; a rate that starts
+    at or below final_float_rate is left unchanged. Works elementwise on arrays.
+    """
+    initial_rate = np.asarray(initial_rate, dtype=float)
+    adjusted = np.maximum(initial_rate - np.asarray(quarter) * monthly_dec, final_float_rate)
+    return np.where(initial_rate > final_float_rate, adjusted, initial_rate)
+
+def compute_rates_over_time(rate_type, initial_rate, duration, final_float_rate, monthly_dec):
+    """Generate a list of rates after each decrement for the duration."""
+    if rate_type.startswith("float"):
+        quarters = np.arange(1, len(range(0, duration, 3)) + 1)
+        return float_rate_at(initial_rate, quarters, final_float_rate, monthly_dec).tolist()
+    # Fixed rate scenario: Apply the same rate for the duration
+    return [initial_rate] * (duration // 3)
+
+def fixed_term_months(rate_type):
+    """Length of the fixed period of a rate type in months, 0 for float."""
+    return 0 if rate_type.startswith("float") else int(rate_type.split('_')[1]) * 12
+
+def _fixed_months(rate_types):
+    """fixed_term_months of every entry of an array of rate types."""
+    rate_types = np.asarray(rate_types, dtype=str)
+    type_names, type_codes = np.unique(rate_types, return_inverse=True)
+    type_terms = np.array([fixed_term_months(name) for name in type_names], dtype=int)
+    return type_terms[type_codes.reshape(rate_types.shape)]
+
+def simulate_rate_paths(mortgage_parts, rate_types, start_rates, discounted, discount, float_rate,
+                        monthly_dec, final_float_rate, duration, minimum_discounted_rate=0.05, amort_rates=None):
+    """Simulate a batch of scenarios quarter by quarter.
+
+    rate_types, start_rates and discounted are (scenarios x parts) arrays. Fixed parts roll onto the
+    float path starting at float_rate once their term ends; each distinct float path is computed once
+    and broadcast to every part that follows it.
+
+    Returns the applied rates and the interest of every quarter as (scenarios x parts x quarters)
+    arrays, the interest per part and per scenario, and the rate each part ends on. As in
+    compute_total_interest_and_final_rates, a fixed term that outlasts the simulation is charged in
+    full, so the part totals can exceed the sum over the simulated quarters. With amort_rates,
+    interest is charged on the declining balance of every part instead of its principal.
+    """
+    amounts = np.asarray(mortgage_parts, dtype=float)
+    rate_types = np.asarray(rate_types, dtype=str)
+    start_rates = np.asarray(start_rates, dtype=float)
+    discounted = np.asarray(discounted, dtype=bool)
+    n_quarters = len(range(0, duration, 3))
+
+    fixed_months = _fixed_months(rate_types)
+    is_fixed = fixed_months > 0
+
+    # Shared float paths, one per distinct starting rate
+    path_starts = np.where(is_fixed, float_rate, start_rates)
+    unique_starts, path_codes = np.unique(path_starts, return_inverse=True)
+    float_paths = float_rate_at(unique_starts[:, None], np.arange(1, n_quarters + 1), final_float_rate, monthly_dec)
+
+    in_fixed_term = np.arange(n_quarters) < (fixed_months // 3)[..., None]
+    rates = np.where(in_fixed_term, start_rates[..., None], float_paths[path_codes.reshape(path_starts.shape)])
+    rates = np.where(discounted[..., None], np.maximum(rates - discount, minimum_discounted_rate), rates)
+    # Balance-months of every quarter, and cumulative ones for the fixed terms beyond the last quarter
+    balances = amortized_balances(amounts, 0 if amort_rates is None else amort_rates,
+                                  max(3 * n_quarters, int(fixed_months.max(initial=0))))
+    cumulative_balances = np.concatenate([np.zeros((len(amounts), 1)), np.cumsum(balances, axis=1)], axis=1)
+    quarter_balances = balances[:, :3 * n_quarters].reshape(len(amounts), n_quarters, 3).sum(axis=-1)
+    interests = calculate_interest_payment(quarter_balances, rates, 1)
+
+    parts = np.arange(len(amounts))
+    committed_balances = (cumulative_balances[parts, np.maximum(fixed_months, 3 * n_quarters)]
+                          - cumulative_balances[:, 3 * n_quarters])
+    fixed_rates = np.where(discounted, np.maximum(start_rates - discount, minimum_discounted_rate), start_rates)
+    part_totals = interests.sum(axis=-1) + calculate_interest_payment(committed_balances, fixed_rates, 1)
+
+    last_rates = rates[..., -1] if n_quarters else start_rates
+    final_rates = np.where(is_fixed & (duration <= fixed_months), start_rates, last_rates)
+    return rates, interests, part_totals, part_totals.sum(axis=-1), final_rates
+
+def compute_final_rates(rate_types, start_rates, discounted, discount, float_rate,
+                        monthly_dec, final_float_rate, duration, minimum_discounted_rate=0.05):
+    """Rate each part ends on, as returned by simulate_rate_paths, without simulating every quarter."""
+    start_rates = np.asarray(start_rates, dtype=float)
+    n_quarters = len(range(0, duration, 3))
+    if not n_quarters:
+        return start_rates
+    fixed_months = _fixed_months(rate_types)
+    is_fixed = fixed_months > 0
+    last_rates = np.where(n_quarters <= fixed_months // 3, start_rates,
+                          float_rate_at(np.where(is_fixed, float_rate, start_rates), n_quarters, final_float_rate, monthly_dec))
+    last_rates = np.where(discounted, np.maximum(last_rates - discount, minimum_discounted_rate), last_rates)
+    return np.where(is_fixed & (duration <= fixed_months), start_rates, last_rates)
+
+def collapse_rate_path(rates, interests, part_total, fixed_months):
+    """Group one part's quarterly path into (rate, interest) pairs, the fixed term as a single entry."""
+    fixed_quarters = fixed_months // 3
+    post_fixed = list(zip(rates[fixed_quarters:], interests[fixed_quarters:]))
+    if not fixed_months:
+        return post_fixed
+    return [(rates[0], part_total - interests[fixed_quarters:].sum())] + post_fixed
+
+def describe_scenario(rates):
+    """Label a scenario given as (rate_type, rate, is_discounted) per part."""
+    return ", ".join(f"Part {idx+1}: {name} @ {rate:.2f}%" for idx, (name, rate, _) in enumerate(rates))
+
+def describe_final_rates(final_rates):
+    return ", ".join(f"{rate:.2f}%" for rate in final_rates)
+
+def simulate_part_costs(mortgage_parts, rate_names, rate_values, discount, float_rate,
+                        monthly_dec, final_float_rate, duration, amort_rates=None):
+    """Total interest of every part on every rate, without and with the discount, as two (parts x rates) arrays."""
+    n_rates = len(rate_names)
+    rate_types = np.repeat(np.tile(np.asarray(rate_names, dtype=str), 2)[:, None], len(mortgage_parts), axis=1)
+    start_rates = np.repeat(np.tile(np.asarray(rate_values, dtype=float), 2)[:, None], len(mortgage_parts), axis=1)
+    discounted = np.repeat(np.arange(2 * n_rates) >= n_rates, len(mortgage_parts)).reshape(rate_types.shape)
+    part_totals = simulate_rate_paths(mortgage_parts, rate_types, start_rates, discounted, discount,
+                                      float_rate, monthly_dec, final_float_rate, duration, amort_rates=amort_rates)[2]
+    return part_totals[:n_rates].T, part_totals[n_rates:].T
+
+
+########################################################################################
+###############################      AMORTIZATION       ################################
+########################################################################################
+def amortized_balances(mortgage_parts, amort_rates, months):
+    """Outstanding balance of every part at the start of each month, as a (parts x months) array.
+
+    Every part pays off amort_rates % of its principal per year in equal monthly instalments until
+    nothing is left; amort_rates is one rate per part or one for all parts.
+    """
+    amounts = np.asarray(mortgage_parts, dtype=float)
+    instalments = amounts * np.broadcast_to(np.asarray(amort_rates, dtype=float), amounts.shape) / 100 / 12
+    return np.maximum(amounts[:, None] - instalments[:, None] * np.arange(months), 0)
+
+
+########################################################################################
+###############################        OPTIMIZER        ################################
+########################################################################################
+def _extend_splits(splits, costs, discounted_part=None):
+    """Append every rate of the next part to each partial split."""
+    codes, discounted_parts, totals = splits
+    n_rates = len(costs)
+    codes = np.hstack([np.repeat(codes, n_rates, axis=0), np.tile(np.arange(n_rates), len(totals))[:, None]])
+    if discounted_part is None:
+        discounted_parts = np.repeat(discounted_parts, n_rates)
+    else:
+        discounted_parts = np.full(len(codes), discounted_part)
+    return codes, discounted_parts, (totals[:, None] + costs[None, :]).ravel()
+
+def _cheapest_splits(candidates, k):
+    """Keep the k cheapest splits, in enumeration order on ties."""
+    codes, discounted_parts, totals = (np.concatenate(parts) for parts in zip(*candidates))
+    if len(totals) > k > 0:
+        # Only candidates up to the k-th smallest total need ordering
+        keep = totals <= np.partition(totals, k - 1)[k - 1]
+        codes, discounted_parts, totals = codes[keep], discounted_parts[keep], totals[keep]
+    order = np.lexsort((discounted_parts, *codes.T[::-1], totals))[:k]
+    return codes[order], discounted_parts[order], totals[order]
+
+def top_k_splits(part_costs, discounted_costs, k):
+    """Exact k cheapest splits with the discount on exactly one part, without enumerating rates^parts.
+
+    part_costs and discounted_costs are (parts x rates) costs of each part on each rate, without and
+    with the discount. A split costs the sum of its parts, so only the k best partial splits over the
+    first parts can lead to one of the k best full splits: they are extended one part at a time, kept
+    separately for whether the discount has been placed yet.
+
+    Returns the rate codes (k x parts), the discounted part and the total of each split, cheapest
+    first and in compute_combination_interests order on ties. There are no splits without parts or rates.
+    """
+    part_costs = np.asarray(part_costs, dtype=float)
+    discounted_costs = np.asarray(discounted_costs, dtype=float)
+    n_parts, n_rates = part_costs.shape
+    if not n_parts or not n_rates:
+        return np.empty((0, n_parts), dtype=int), np.empty(0, dtype=int), np.empty(0)
+    undiscounted = (np.empty((1, 0), dtype=int), np.full(1, -1), np.zeros(1))
+    with_discount = (np.empty((0, 0), dtype=int), np.empty(0, dtype=int), np.empty(0))
+    for part in range(n_parts):
+        with_discount = _cheapest_splits([_extend_splits(with_discount, part_costs[part]),
+                                          _extend_splits(undiscounted, discounted_costs[part], part)], k)
+        undiscounted = _cheapest_splits([_extend_splits(undiscounted, part_costs[part])], k)
+    return with_discount
+
+
+########################################################################################
+###############################   RE-FIXING PLANNER     ################################
+########################################################################################
+def plan_refixing(setup, adjustment, rate_names=None, minimum_discounted_rate=0.05):
+    """Cheapest sequence of products per part when a new product can be chosen whenever a term ends.
+
+    A fixed product is offered at its base rate moved by how far the float rate has moved since
+    the start, never below minimum_discounted_rate, and locks the part for its whole term (charged in full, as in simulate_rate_paths);
+    float is reconsidered every quarter. The cheapest cost from every (part, discount, quarter)
+    state is found by dynamic programming backwards over the quarters, so the work grows with
+    parts x quarters x products rather than with the number of decision sequences.
+
+    Returns the discounted part, every part's plan as (first quarter, last quarter + 1, rate type,
+    rate) entries, the cost per part and the total. Without any rate to choose there is no plan:
+    the discounted part is -1 and every part's plan is empty.
+    """
+    names, values = setup.rate_table(rate_names)
+    amounts = np.asarray(setup.principals, dtype=float)
+    n_parts, n_quarters = len(amounts), len(range(0, adjustment.duration, 3))
+    if not len(names) or not n_parts:
+        return -1, [[] for _ in range(n_parts)], np.zeros(n_parts), 0.0
+    term_quarters = np.array([fixed_term_months(name) // 3 for name in names], dtype=int)
+    is_fixed = term_quarters > 0
+    lengths = np.where(is_fixed, term_quarters, 1)
+
+    balances = amortized_balances(amounts, setup.amort_rates or 0, 3 * (n_quarters + int(lengths.max(initial=1))))
+    cumulative_balances = np.concatenate([np.zeros((n_parts, 1)), np.cumsum(balances, axis=1)], axis=1)
+
+    # Rate of every product when chosen at the start of each quarter, without and with the discount
+    quarters = np.arange(n_quarters)[:, None]
+    float_moves = float_rate_at(setup.float_rate, quarters, adjustment.final_float_rate, adjustment.monthly_dec) - setup.float_rate
+    offered = np.where(is_fixed, np.maximum(values + float_moves, minimum_discounted_rate),
+                       float_rate_at(values, quarters + 1, adjustment.final_float_rate, adjustment.monthly_dec))
+    applied = np.stack([offered, np.maximum(offered - setup.discount, minimum_discounted_rate)])  # (2 x quarters x products)
+
+    costs_from = np.zeros((n_parts, 2, n_quarters + 1))
+    policy = np.zeros((n_parts, 2, n_quarters), dtype=int)
+    for quarter in reversed(range(n_quarters)):
+        ends = quarter + lengths
+        balance_months = cumulative_balances[:, 3 * ends] - cumulative_balances[:, [3 * quarter]]  # (parts x products)
+        costs = (calculate_interest_payment(balance_months[:, None, :], applied[None, :, quarter, :], 1)
+                 + costs_from[:, :, np.minimum(ends, n_quarters)])
+        policy[:, :, quarter] = costs.argmin(axis=-1)
+        costs_from[:, :, quarter] = costs.min(axis=-1)
+
+    # Cheapest placement of the discount, then walk the policy forwards
+    plain_costs, discounted_costs = costs_from[:, 0, 0], costs_from[:, 1, 0]
+    discounted_part = int(np.argmin(discounted_costs - plain_costs))
+    part_costs = np.where(np.arange(n_parts) == discounted_part, discounted_costs, plain_costs)
+    plans = []
+    for part in range(n_parts):
+        flag = int(part == discounted_part)
+        plan, quarter = [], 0
+        while quarter < n_quarters:
+            product = policy[part, flag, quarter]
+            end = min(quarter + lengths[product], n_quarters)
+            if plan and not is_fixed[product] and plan[-1][2] == names[product]:
+                plan[-1] = (plan[-1][0], end, plan[-1][2], plan[-1][3])
+            else:
+                plan.append((quarter, end, str(names[product]), float(applied[flag, quarter, product])))
+            quarter = end
+        plans.append(plan)
+    return discounted_part, plans, part_costs, part_costs.sum()
+
+def describe_plan(plan):
+    """Label a plan returned by plan_refixing with 1-based quarters."""
+    entries = []
+    for start, end, name, rate in plan:
+        quarters = f"Q{start+1}-Q{end}" if end - start > 1 else f"Q{start+1}"
+        entries.append(f"{quarters}: {name} {'@' if fixed_term_months(name) else 'from'} {rate:.2f}%")
+    return ", ".join(entries)
+
+
+########################################################################################
+###############################        SCENARIOS        ################################
+########################################################################################
+def simulate_scenario(setup, rates, adjustment):
+    """Total interest, description, final rates and per-part details of one (rate_type, rate, is_discounted) split."""
+    rate_types, start_rates, discounted = zip(*rates)
+    path_rates, interests, part_totals, totals, final_rates = simulate_rate_paths(
+        setup.principals, [rate_types], [start_rates], [discounted], setup.discount, setup.float_rate, *adjustment,
+        amort_rates=setup.amort_rates or None)
+
+    detailed_interests = [collapse_rate_path(path_rates[0, idx], interests[0, idx], part_totals[0, idx], fixed_term_months(rate_type))
+                          for idx, rate_type in enumerate(rate_types)]
+    return totals[0], describe_scenario(rates), describe_final_rates(final_rates[0]), detailed_interests
+
+def best_monthly_splits(setup, k, rate_names=None, months=None):
+    """The k splits with the lowest monthly interest, averaged over months when the setup amortizes."""
+    _, rate_values = setup.rate_table(rate_names)
+    amounts = setup.average_balances(months)[:, None]
+    return top_k_splits(compute_monthly_interest(amounts, rate_values),
+                        compute_monthly_interest(amounts, rate_values - setup.discount), k)
+
+def best_adjusted_splits(setup, adjustment, k, rate_names=None):
+    """The k splits with the lowest interest over the adjustment horizon, as returned by top_k_splits."""
+    names, rate_values = setup.rate_table(rate_names)
+    part_costs, discounted_costs = simulate_part_costs(setup.principals, names, rate_values, setup.discount,
+                                                       setup.float_rate, *adjustment, amort_rates=setup.amort_rates or None)
+    return top_k_splits(part_costs, discounted_costs, k)
@@ -0,0 +1,117 @@
+"""Stochastic float-rate paths for the mortgage optimizer.
+
+The deterministic model in common.loan_calc moves the float rate by a fixed step every quarter.
+Here thousands of float paths are drawn at once and every split is evaluated against all of them.
+A split's cost is the sum of its parts' costs, so only (parts x rates x discount) costs are
+computed per path; paths are processed in chunks so no (scenarios x paths x quarters) tensor is
+ever built.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from common.loan_calc import amortized_balances, fixed_term_months, float_rate_at
+
+MODELS = ('random_walk', 'mean_reverting')
+
+
+class StochasticRates(NamedTuple):
+    """How float paths are drawn: the model, quarterly volatility in percentage points and the seed."""
+    model: str = 'random_walk'
+    volatility: float = 0.15
+    reversion: float = 0.2
+    n_paths: int = 10000
+    seed: int = 0
+    chunk_size: int = 1000
+
+
+def simulate_float_paths(float_rate, adjustment, stochastic):
+    """Yield chunks of (paths x quarters) float rates, quarter q holding the rate after q + 1 steps.
+
+    The random walk adds its shocks to the deterministic path, which drifts down by monthly_dec per
+    quarter until it reaches final_float_rate, so with no volatility it is that path; the
+    mean-reverting model pulls the rate towards final_float_rate by `reversion` of the gap per
+    quarter. Rates never go below zero. The draws only depend on the seed, not on the chunk size.
+    """
+    if stochastic.model not in MODELS:
+        raise ValueError(f"Unknown rate model {stochastic.model!r}, expected one of {MODELS}")
+    n_quarters = len(range(0, adjustment.duration, 3))
+    rng = np.random.default_rng(stochastic.seed)
+    drift = float_rate_at(float(float_rate), np.arange(1, n_quarters + 1), adjustment.final_float_rate,
+                          adjustment.monthly_dec)
+    for start in range(0, stochastic.n_paths, stochastic.chunk_size):
+        n_paths = min(stochastic.chunk_size, stochastic.n_paths - start)
+        shocks = rng.normal(0.0, stochastic.volatility, (n_paths, n_quarters))
+        if stochastic.model == 'random_walk':
+            paths = drift + np.cumsum(shocks, axis=1)
+        else:
+            paths = np.empty_like(shocks)
+            rate = np.full(n_paths, float(float_rate))
+            for quarter in range(n_quarters):
+                rate = rate + stochastic.reversion * (adjustment.final_float_rate - rate) + shocks[:, quarter]
+                paths[:, quarter] = rate
+        yield np.maximum(paths, 0.0)
+
+
+def part_costs_on_paths(mortgage_parts, rate_names, rate_values, discount, paths, minimum_discounted_rate=0.05,
+                        amort_rates=None):
+    """Interest of every part on every rate, without and with the discount, on every path.
+
+    Returns a (parts x rates x 2 x paths) array. Fixed terms are charged in full, as in
+    simulate_rate_paths, and roll onto the path once they end. With amort_rates, interest is
+    charged on each part's declining balance.
+    """
+    amounts = np.asarray(mortgage_parts, dtype=float)
+    n_parts, n_quarters = len(amounts), paths.shape[1]
+    term_months = np.array([fixed_term_months(name) for name in rate_names], dtype=int)
+    rate_values = np.asarray(rate_values, dtype=float)
+
+    balances = amortized_balances(amounts, 0 if amort_rates is None else amort_rates,
+                                  max(3 * n_quarters, int(term_months.max(initial=0))))
+    quarter_balances = balances[:, :3 * n_quarters].reshape(n_parts, n_quarters, 3).sum(axis=-1)
+    term_balances = np.concatenate([np.zeros((n_parts, 1)), np.cumsum(balances, axis=1)], axis=1)[:, term_months]
+
+    # Balance-weighted rate sum of every path from each quarter to the end, without and with the discount
+    applied = np.stack([paths, np.maximum(paths - discount, minimum_discounted_rate)])
+    weighted = applied[None] * quarter_balances[:, None, None, :]  # (parts x 2 x paths x quarters)
+    remaining = np.zeros(weighted.shape[:3] + (n_quarters + 1,))
+    remaining[..., :-1] = np.cumsum(weighted[..., ::-1], axis=-1)[..., ::-1]
+    float_from = remaining[..., np.minimum(term_months // 3, n_quarters)]  # (parts x 2 x paths x rates)
+
+    fixed_rates = np.stack([rate_values, np.maximum(rate_values - discount, minimum_discounted_rate)])  # (2 x rates)
+    rate_balances = (fixed_rates[None] * term_balances[:, None, :])[:, :, None, :] + float_from
+    return rate_balances.transpose(0, 3, 1, 2) / 100 / 12
+
+
+def evaluate_splits(setup, adjustment, stochastic, codes, discounted, rate_names=None, percentiles=(5, 50, 95)):
+    """Cost distribution of every split over the simulated float paths.
+
+    codes and discounted are (scenarios x parts) rate codes and discount flags, as produced by
+    enumerate_discount_scenarios. Returns the mean cost, the requested percentiles (scenarios x
+    percentiles) and, for every fixed rate type, the probability of costing less than putting every
+    part on that rate type with the same discount placement.
+    """
+    names, values = setup.rate_table(rate_names)
+    codes = np.asarray(codes)
+    discounted = np.asarray(discounted, dtype=bool)
+    parts = np.arange(codes.shape[1])
+    fixed_codes = {str(name): code for code, name in enumerate(names) if fixed_term_months(name)}
+
+    totals = np.empty((len(codes), stochastic.n_paths), dtype=np.float32)
+    beats = {name: np.zeros(len(codes)) for name in fixed_codes}
+    done = 0
+    for paths in simulate_float_paths(setup.float_rate, adjustment, stochastic):
+        costs = part_costs_on_paths(setup.principals, names, values, setup.discount, paths,
+                                    amort_rates=setup.amort_rates or None)
+        chunk_totals = costs[parts, codes, discounted.astype(int)].sum(axis=1)  # (scenarios x paths)
+        for name, code in fixed_codes.items():
+            reference = costs[parts, code, discounted.astype(int)].sum(axis=1)
+            beats[name] += (chunk_totals < reference).sum(axis=1)
+        totals[:, done:done + len(paths)] = chunk_totals
+        done += len(paths)
+
+    return {
+        'mean': totals.mean(axis=1, dtype=np.float64),
+        'percentiles': np.percentile(totals, percentiles, axis=1).T,
+        'beat_fixed': {name: count / stochastic.n_paths for name, count in beats.items()},
+    }
@@ -0,0 +1,104 @@
+"""Totals of the expected income and expenses tables and their monthly history.
+
+The tables are journaled (see common.storage), which keeps every numeric column's sum in
+df.attrs['column_totals'] up to date delta by delta, so the summary never sums a table. Whenever an
+edit changes the totals they are recorded as the month's row of the history table, with the running
+sum of the monthly savings next to them; the savings over any range of months are then the
+difference of two running sums, months after the last row keeping its savings.
+"""
+import numpy as np
+import pandas as pd
+
+from common.storage import append_to_journal, load_journaled_tables
+
+INCOME_TABLE = 'expected_income'
+EXPENSES_TABLE = 'expected_expenses'
+HISTORY_TABLE = 'expected_savings_history'
+
+
+def parse_amounts(values):
+    """{column: number or None for blank} of text inputs, and the columns whose value is not a number."""
+    amounts, invalid = {}, []
+    for col, value in values.items():
+        text = str(value).strip().replace(' ', '').replace(',', '.')
+        if text in ('', 'nan', '<NA>', 'None'):
+            amounts[col] = None
+            continue
+        try:
+            number = float(text)
+        except ValueError:
+            invalid.append(col)
+            continue
+        amounts[col] = int(number) if number.is_integer() else number
+    return amounts, invalid
+
+
+def column_totals(df):
+    """{column: sum} of a journaled table, summed here only for frames that did not come with them."""
+    totals = df.attrs.get('column_totals')
+    if totals is None:
+        totals = {col: float(df[col].sum()) for col in df.columns if pd.api.types.is_numeric_dtype(df[col].dtype)}
+    return totals
+
+
+def table_total(df):
+    return sum(column_totals(df).values())
+
+
+def record_month(bucket_name, history, month, income, expenses):
+    """Record the month's totals in the history table unless they are there already, and return the history.
+
+    Only the current month changes: its row is replaced, or appended once a new month starts after
+    rows for the months without edits in between, which kept the previous totals. Running sums
+    follow from the previous row. Rows are written at their position rather than appended, so
+    sessions recording the same month at once write the same rows instead of one set each.
+    """
+    rows = []
+    row = len(history)
+    previous = 0.0
+    if len(history):
+        last = history.iloc[-1]
+        if month < last['month']:
+            return history  # Clock went back, history only moves forward
+        if month == last['month']:
+            row = len(history) - 1
+            if (last['income'], last['expenses']) == (income, expenses):
+                return history
+            previous = float(history['cumulative_savings'].iloc[-2]) if len(history) > 1 else 0.0
+        else:
+            previous = float(last['cumulative_savings'])
+            for skipped in pd.period_range(pd.Period(last['month']) + 1, pd.Period(month) - 1, freq='M'):
+                previous += float(last['savings'])
+                rows.append({'month': str(skipped), 'income': last['income'], 'expenses': last['expenses'],
+                             'savings': last['savings'], 'cumulative_savings': previous})
+    savings = income - expenses
+    rows.append({'month': month, 'income': income, 'expenses': expenses, 'savings': savings,
+                 'cumulative_savings': previous + savings})
+    for offset, values in enumerate(rows):
+        append_to_journal(bucket_name, HISTORY_TABLE, 'upsert', quiet=True, row=row + offset, values=values)
+    return pd.concat([history.iloc[:row], pd.DataFrame(rows)], ignore_index=True)
+
+
+def record_totals(bucket_name, month):
+    """Record the month's totals from the income and expenses tables as they are now, after an edit of one of them."""
+    tables = load_journaled_tables(bucket_name, [INCOME_TABLE, EXPENSES_TABLE, HISTORY_TABLE])
+    return record_month(bucket_name, tables[HISTORY_TABLE], month,
+                        int(table_total(tables[INCOME_TABLE])), int(table_total(tables[EXPENSES_TABLE])))
+
+
+def savings_between(history, first_month, last_month):
+    """Sum of the monthly savings from first_month to last_month, both 'YYYY-MM' and included.
+
+    Months after the last recorded one had no edits, they save as much as it did.
+    """
+    if history.empty:
+        return 0.0
+    months = history['month'].to_numpy(dtype=str)
+    cumulative = history['cumulative_savings'].to_numpy(dtype=float)
+    start = np.searchsorted(months, first_month, side='left')
+    end = np.searchsorted(months, last_month, side='right')
+    total = float(cumulative[end - 1] - (cumulative[start - 1] if start else 0.0)) if end > start else 0.0
+    unrecorded = pd.Period(last_month) - max(pd.Period(first_month), pd.Period(months[-1]) + 1)
+    if unrecorded.n >= 0:
+        total += (unrecorded.n + 1) * float(history['savings'].iloc[-1])
+    return total
@@ -0,0 +1,137 @@
+"""Compact columnar store of evaluated mortgage splits.
+
+A split is held as one small integer code per part into the rate table plus the index of the
+discounted part, and every value computed for it (totals, percentiles, probabilities) as one
+contiguous array per column. That is a dozen or so bytes per scenario instead of a row of Python
+objects, so grids of millions of scenarios stay small. Labels are only built for the rows that are
+shown, the top rows are found with argpartition, and the store exports to Arrow without copying
+the columns, the rate codes becoming dictionary-encoded columns.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from common import loan_calc
+
+
+def code_dtype(n_values):
+    """Smallest signed integer type that can index n_values entries, signed as Arrow dictionaries expect."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+
+def downsample_minmax(values, n_buckets):
+    """Indices, in order, of the lowest and highest value of each of n_buckets runs of consecutive values.
+
+    A line through these points has the same envelope as one through every value, so plots of
+    millions of scenarios keep their spikes while drawing at most 2 * n_buckets points.
+    """
+    values = np.asarray(values)
+    if len(values) <= 2 * n_buckets:
+        return np.arange(len(values))
+    size = -(-len(values) // n_buckets)
+    n_full = len(values) // size
+    full = values[:n_full * size].reshape(n_full, size)
+    starts = np.arange(n_full) * size
+    lows, highs = [starts + full.argmin(axis=1)], [starts + full.argmax(axis=1)]
+    if n_full * size < len(values):
+        tail = values[n_full * size:]
+        lows.append([n_full * size + tail.argmin()])
+        highs.append([n_full * size + tail.argmax()])
+    return np.unique(np.concatenate(lows + highs))
+
+
+class ScenarioStore(NamedTuple):
+    """Splits as rate codes (parts x scenarios) into rate_names and rate_values, the discounted part
+    of every scenario, and {name: array} of one value per scenario."""
+    rate_names: np.ndarray
+    rate_values: np.ndarray
+    discount: float
+    codes: np.ndarray
+    discounted_part: np.ndarray
+    columns: dict
+
+    @classmethod
+    def enumerate(cls, n_parts, rate_names, rate_values, discount, **columns):
+        """Every split with the discount on each part in turn, in compute_combination_interests order."""
+        n_rates = len(rate_values)
+        dtype = code_dtype(max(n_rates, n_parts))
+        codes = np.indices((n_rates,) * n_parts, dtype=dtype).reshape(n_parts, -1)
+        codes = np.repeat(codes, n_parts, axis=1)
+        discounted_part = np.tile(np.arange(n_parts, dtype=dtype), n_rates ** n_parts)
+        return cls(np.asarray(rate_names, dtype=str), np.asarray(rate_values, dtype=float), discount,
+                   codes, discounted_part, columns)
+
+    @property
+    def n_scenarios(self):
+        return len(self.discounted_part)
+
+    @property
+    def n_parts(self):
+        return len(self.codes)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.discounted_part.nbytes + sum(column.nbytes for column in self.columns.values())
+
+    def with_columns(self, **columns):
+        return self._replace(columns={**self.columns, **columns})
+
+    def discounted(self):
+        """(scenarios x parts) discount flags, as expected by monte_carlo.evaluate_splits."""
+        return np.arange(self.n_parts) == self.discounted_part[:, None]
+
+    def top(self, column, k):
+        """Indices of the k scenarios with the smallest values in the column, smallest first and ties by index.
+
+        Only the k smallest (and whatever ties the k-th) are sorted, the rest is split off with argpartition.
+        """
+        values = self.columns[column]
+        k = min(k, len(values))
+        if k <= 0:
+            return np.empty(0, dtype=int)
+        if k < len(values):
+            # argpartition picks any of the values tied with the k-th, keep them all so the lowest indices win
+            smallest = np.flatnonzero(values <= values[np.argpartition(values, k - 1)[k - 1]])
+        else:
+            smallest = np.arange(len(values))
+        return smallest[np.lexsort((smallest, values[smallest]))][:k]
+
+    def parts(self, index):
+        """(rate type, rate, is discounted) of every part of one scenario, rates before the discount."""
+        codes = self.codes[:, index]
+        discounted_part = self.discounted_part[index]
+        return [(str(self.rate_names[code]), float(self.rate_values[code]), part == discounted_part)
+                for part, code in enumerate(codes)]
+
+    def labels(self, indices):
+        """Scenario labels of the given rows, with the discount applied to the discounted part."""
+        return [loan_calc.describe_split(self.codes[:, index], self.discounted_part[index], self.rate_names,
+                                         self.rate_values, self.discount)
+                for index in indices]
+
+    def to_arrow(self):
+        """pyarrow Table of the store: a dictionary-encoded rate type column per part on top of the codes,
+        the discounted part (numbered from 1) and every value column, which are not copied."""
+        import pyarrow as pa
+
+        names = pa.array(self.rate_names.tolist(), type=pa.string())
+        arrays = {f'part_{part + 1}_rate': pa.DictionaryArray.from_arrays(pa.array(codes), names)
+                  for part, codes in enumerate(self.codes)}
+        arrays['discount_on'] = pa.array(self.discounted_part + 1)
+        arrays.update((name, pa.array(column)) for name, column in self.columns.items())
+        rates = {name: f'{value:g}' for name, value in zip(self.rate_names, self.rate_values)}
+        return pa.table(arrays).replace_schema_metadata({**{f'rate.{name}': value for name, value in rates.items()},
+                                                         'discount': f'{self.discount:g}'})
+
+    def to_arrow_ipc(self):
+        """The Arrow table as an IPC file (Feather v2), for downloads."""
+        import pyarrow as pa
+
+        table = self.to_arrow()
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
@@ -0,0 +1,600 @@
+"""Storage shared by the pages.
+
+Every bucket is reached through a backend from common.backends, chosen by storage_params.backend
+or the EXPENSENSE_STORAGE environment variable: 's3', 'cached_s3' (S3 behind a local disk tier)
+or 'local' (a directory, to run offline).
+One S3 client per process, built from st.secrets with a connection pool and retries, is reused by
+every rerun and session instead of building a new client (and new TLS connections) per call.
+Parsed DataFrames are cached by bucket and key and revalidated against the object's ETag, so an
+unchanged file costs a single 304 response and no parsing.
+Tables are stored as zstd-compressed Parquet, which keeps the column types and is read straight
+from the response bytes; a table still stored as CSV is read from there and migrated on first load.
+Edits to a table are appended as small JSON deltas under <name>.journal/ and merged on read; once
+enough of them pile up they are folded into a new snapshot in the background, which records the
+keys of the deltas it holds.
+Large uploads are streamed in chunks, optionally gzip-compressed, and sent as multipart uploads
+with parts in parallel, so only a few parts are ever held in memory.
+Bucket listings page through every key except the journal deltas and are kept in an index that
+our own writes update; once it is older than KEY_INDEX_TTL only the keys after its last one are listed.
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+
+import boto3
+import pandas as pd
+import streamlit as st
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from common import tracing
+from common.backends import (PART_SIZE, UPLOAD_WORKERS, CachedBackend, LocalBackend, NoSuchKey, NotModified,
+                             ObjectInfo, PreconditionFailed, S3Backend)
+from common.config import storage_params
+
+logger = logging.getLogger(__name__)
+
+S3_CONFIG = Config(
+    max_pool_connections=20,
+    retries={'max_attempts': 5, 'mode': 'standard'},
+    connect_timeout=5,
+    read_timeout=30,
+)
+# Number of parsed DataFrames kept in the read cache
+DF_CACHE_SIZE = 32
+# A table's journal is compacted into a new snapshot once it holds this many deltas or bytes
+JOURNAL_MAX_DELTAS = 32
+JOURNAL_MAX_BYTES = 256 * 1024
+# Threads fetching objects in parallel, within the client's connection pool
+FETCH_WORKERS = 8
+# Rows serialized to CSV at a time when streaming a DataFrame out
+CSV_CHUNK_ROWS = 10_000
+# Seconds a bucket listing is served from the key index before it is listed again
+KEY_INDEX_TTL = 60
+
+
+def _aws_secrets():
+    try:
+        return dict(st.secrets["aws"])
+    except (KeyError, FileNotFoundError):
+        return {}  # No secrets, boto3 falls back to its environment variables and instance profile
+
+
+@st.cache_resource
+def get_s3_client():
+    """Process-wide S3 client, boto3 clients are safe to share between threads."""
+    aws = _aws_secrets()
+    session = boto3.session.Session(aws_access_key_id=aws.get("access_key_id"),
+                                    aws_secret_access_key=aws.get("secret_access_key"),
+                                    region_name=aws.get("region"))
+    # An endpoint_url points the client at an S3 stand-in such as a moto server
+    return session.client('s3', config=S3_CONFIG, endpoint_url=aws.get("endpoint_url"))
+
+
+@st.cache_resource
+def get_fetch_pool():
+    """Process-wide thread pool for fetching several objects at once over the shared client."""
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='s3-fetch')
+
+
+def _fetch_all(fetch, bucket_name, names):
+    """{name: fetch(bucket_name, name)} fetched in parallel, so it takes about as long as the slowest one.
+
+    Errors are reported here rather than in the pool's threads, which cannot draw on the page.
+    """
+    fetch = tracing.bind(fetch)
+    futures = {name: get_fetch_pool().submit(fetch, bucket_name, name) for name in names}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            st.error(f"Error loading data from S3: {e}")
+            results[name] = None
+    return results
+
+
+@st.cache_resource
+def get_upload_pool():
+    """Process-wide thread pool sending multipart upload parts, separate from the fetch pool it may be called from."""
+    return ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='s3-upload')
+
+
+@st.cache_resource
+def get_backend(bucket_name):
+    """Process-wide backend of the bucket."""
+    kind = os.environ.get('EXPENSENSE_STORAGE', storage_params.backend)
+    if kind == 'local':
+        return LocalBackend(os.path.join(storage_params.local_root, bucket_name))
+    if kind not in ('s3', 'cached_s3'):
+        raise ValueError(f"Unknown storage backend {kind!r}, expected 's3', 'cached_s3' or 'local'")
+    backend = S3Backend(get_s3_client(), bucket_name, get_upload_pool())
+    if kind == 'cached_s3':
+        backend = CachedBackend(backend, os.path.join(storage_params.cache_dir, bucket_name),
+                                storage_params.cache_max_bytes, storage_params.cache_max_age)
+    return backend
+
+
+@st.cache_resource
+def get_df_cache():
+    """Process-wide LRU of (ETag, DataFrame) by (bucket, key), with the lock guarding it."""
+    return OrderedDict(), threading.Lock()
+
+
+def _cached_df(bucket_name, file_path):
+    cache, lock = get_df_cache()
+    with lock:
+        entry = cache.get((bucket_name, file_path))
+        if entry is not None:
+            cache.move_to_end((bucket_name, file_path))
+        return entry
+
+
+def _cache_df(bucket_name, file_path, etag, df):
+    cache, lock = get_df_cache()
+    with lock:
+        if etag is None:
+            cache.pop((bucket_name, file_path), None)
+            return
+        cache[(bucket_name, file_path)] = (etag, df)
+        cache.move_to_end((bucket_name, file_path))
+        while len(cache) > DF_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _parse_body(body, file_path):
+    if body.strip() == b"":
+        return pd.DataFrame()  # Return an empty DataFrame if the file is empty
+    if file_path.endswith('.parquet'):
+        return pd.read_parquet(BytesIO(body))
+    return pd.read_csv(BytesIO(body))
+
+
+def _parse_object(obj, file_path):
+    """DataFrame from a StoredObject; CSV is parsed as it streams in, gunzipped if it was stored compressed."""
+    body = obj.body
+    if obj.content_encoding == 'gzip':
+        body = gzip.GzipFile(fileobj=body)
+    if file_path.endswith('.parquet'):
+        return _parse_body(body.read(), file_path)
+    try:
+        return pd.read_csv(body)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()  # Return an empty DataFrame if the file is empty
+
+
+def _csv_chunks(df, chunk_rows=CSV_CHUNK_ROWS):
+    """The DataFrame as CSV, encoded CSV_CHUNK_ROWS rows at a time, the header with the first chunk."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0).encode('utf-8')
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _typed_columns(df):
+    """Columns typed for Parquet: text columns become numbers when every value parses as one, strings otherwise."""
+    df = df.reset_index(drop=True)
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if not pd.api.types.is_string_dtype(df[col].dtype):
+            continue
+        values = df[col].replace('', pd.NA)
+        numbers = pd.to_numeric(values, errors='coerce')
+        if numbers.notna().sum() == values.notna().sum() and values.notna().any():
+            df[col] = numbers
+        else:
+            df[col] = df[col].astype('string')
+    return df
+
+
+def _amount(value):
+    """A cell as a number for the column totals, 0 when it is empty or not a number."""
+    number = pd.to_numeric(pd.Series([value], dtype=object), errors='coerce').iloc[0]
+    return 0.0 if pd.isna(number) else float(number)
+
+
+def _numeric_columns(df):
+    return [col for col in df.columns
+            if pd.api.types.is_numeric_dtype(df[col].dtype) and not pd.api.types.is_bool_dtype(df[col].dtype)]
+
+
+def _column_totals(df):
+    """Sum of every numeric column, stored in the snapshot's attrs and then kept up to date delta by delta."""
+    return {str(col): float(df[col].sum()) for col in _numeric_columns(df)}
+
+
+def iter_objects(bucket_name, prefix='', delimiter='/', start_after=''):
+    """Yield the objects under the prefix as the backend lists them, one page at a time on S3.
+
+    With a delimiter, keys below the next delimiter after the prefix (like the table journals) are
+    skipped by S3 itself instead of being listed and filtered out here; keys up to start_after are
+    skipped the same way.
+    """
+    return get_backend(bucket_name).list(prefix, delimiter, start_after)
+
+
+@st.cache_resource
+def get_key_index():
+    """Process-wide listings by (bucket, prefix, delimiter) as (listing time, {key: ObjectInfo}), with the lock guarding them."""
+    return {}, threading.Lock()
+
+
+def _index_update(bucket_name, key, info):
+    """Record a write (an ObjectInfo) or a delete (None) of ours in every listing the key belongs to."""
+    if _journal_of(key):
+        return  # Listings leave the journal deltas out
+    index, lock = get_key_index()
+    with lock:
+        for (bucket, prefix, delimiter), (_, objects) in index.items():
+            if bucket != bucket_name or not key.startswith(prefix):
+                continue
+            if delimiter and delimiter in key[len(prefix):]:
+                continue
+            if info is None:
+                objects.pop(key, None)
+            else:
+                objects[key] = info
+
+
+def _index_put(bucket_name, key, size, etag):
+    _index_update(bucket_name, key, ObjectInfo(key, size, etag, datetime.now(timezone.utc)))
+
+
+def _iter_files(bucket_name, prefix, delimiter, start_after=''):
+    """iter_objects without the journal deltas: the listing starts again after each journal it runs into,
+    so a journal costs one request instead of a page per thousand deltas."""
+    while True:
+        for info in iter_objects(bucket_name, prefix, delimiter, start_after):
+            journal = _journal_of(info.key)
+            if journal:
+                start_after = f'{journal}\U0010ffff'
+                break
+            yield info
+        else:
+            return
+
+
+def list_objects_indexed(bucket_name, prefix='', delimiter=None, suffix='', refresh=False):
+    """Objects under the prefix whose key ends with the suffix, sorted by key, from the key index.
+
+    Keys in every "folder" below the prefix are listed unless a delimiter is given, journal deltas
+    never are. Once the index is older than KEY_INDEX_TTL, only the keys after its last one are
+    listed and added, which picks up new keys named in increasing order (like time-stamped ones)
+    for the cost of a request. Keys others added before the last one and keys others deleted only
+    show up after refresh, which lists everything again.
+    """
+    index, lock = get_key_index()
+    entry_key = (bucket_name, prefix, delimiter)
+    with lock:
+        entry = index.get(entry_key)
+    if refresh or entry is None:
+        listed_at = time.monotonic()
+        objects = {info.key: info for info in _iter_files(bucket_name, prefix, delimiter)}
+        with lock:
+            index[entry_key] = entry = (listed_at, objects)
+    elif time.monotonic() - entry[0] > KEY_INDEX_TTL:
+        listed_at = time.monotonic()
+        with lock:
+            last = max(entry[1], default='')
+        added = {info.key: info for info in _iter_files(bucket_name, prefix, delimiter, last)}
+        with lock:
+            entry[1].update(added)
+            index[entry_key] = entry = (listed_at, entry[1])
+    with lock:
+        return sorted((info for info in entry[1].values() if info.key.endswith(suffix)), key=lambda info: info.key)
+
+
+# Function to add a new .csv file to the S3 bucket
+def add_csv_to_s3(bucket_name, file_path, csv_content="", compress=False):
+    # Create a CSV file in S3, streamed in parts and optionally gzipped
+    body = csv_content.encode('utf-8')
+    chunks = (body[start:start + PART_SIZE] for start in range(0, max(len(body), 1), PART_SIZE))
+    if compress:
+        chunks = _gzip_chunks(chunks)
+    etag, size, _ = get_backend(bucket_name).put(file_path, chunks, 'text/csv', 'gzip' if compress else None)
+    _index_put(bucket_name, file_path, size, etag)
+    st.success(f"File {file_path} created in bucket {bucket_name}.")
+
+
+def _put_df(df, bucket_name, file_path, compress=False, if_match=None, if_none_match=None):
+    """Upload a DataFrame as Parquet or CSV depending on the key, cache what a reader would get back and return its ETag.
+
+    CSV is streamed out in chunks, gzipped with compress. Parquet is already compressed.
+    """
+    if file_path.endswith('.parquet'):
+        with tracing.span('storage.serialize', key=file_path):
+            df = _typed_columns(df)
+            df.attrs['column_totals'] = _column_totals(df)
+            buffer = BytesIO()
+            df.to_parquet(buffer, index=False, compression='zstd')
+        chunks, content_type, compress = [buffer.getvalue()], 'application/vnd.apache.parquet', False
+    else:
+        chunks, content_type = _csv_chunks(df), 'text/csv'
+        if compress:
+            chunks = _gzip_chunks(chunks)
+    etag, size, body = get_backend(bucket_name).put(file_path, chunks, content_type, 'gzip' if compress else None,
+                                                    if_match, if_none_match)
+    _index_put(bucket_name, file_path, size, etag)
+    if not file_path.endswith('.parquet'):
+        if body is None:
+            _cache_df(bucket_name, file_path, None, None)  # Too large to parse back here, the next load fetches it
+            return etag
+        df = _parse_body(gzip.decompress(body) if compress else body, file_path)
+    # Cache the written frame, so the next load only revalidates
+    _cache_df(bucket_name, file_path, etag, df.copy())
+    return etag
+
+
+def save_df_to_s3(df, bucket_name, file_path, compress=False):
+    """Upload a DataFrame to S3, as Parquet for a .parquet key and as CSV otherwise, gzipped with compress."""
+    _put_df(df, bucket_name, file_path, compress)
+    st.success(f'DataFrame saved to S3 successfully: {file_path}')
+
+
+def _get_df(bucket_name, file_path):
+    """DataFrame stored at the key and the ETag of the bytes it was parsed from, or (None, None) if there is no such key.
+
+    The frame is served from the cache while its ETag is unchanged. The ETag returned is always
+    the one of this frame, never of a newer object that another thread cached meanwhile.
+    """
+    cached = _cached_df(bucket_name, file_path)
+    try:
+        obj = get_backend(bucket_name).get(file_path, if_none_match=cached[0] if cached else None)
+    except NotModified:
+        tracing.count('df_cache.hits')
+        return cached[1].copy(), cached[0]
+    except NoSuchKey:
+        _cache_df(bucket_name, file_path, None, None)
+        return None, None
+    except Exception:
+        _cache_df(bucket_name, file_path, None, None)
+        raise
+    with tracing.span('storage.parse', key=file_path):
+        df = _parse_object(obj, file_path)
+    _cache_df(bucket_name, file_path, obj.etag, df)
+    return df.copy(), obj.etag
+
+
+def load_df_from_s3(bucket_name, file_path):
+    """Load a DataFrame from a Parquet or CSV file on S3, or an empty one if the file does not exist."""
+    try:
+        df, _ = _get_df(bucket_name, file_path)
+    except Exception as e:
+        st.error(f"Error loading data from S3: {e}")
+        return pd.DataFrame()
+    return pd.DataFrame() if df is None else df
+
+
+def _read_table(bucket_name, name):
+    """The table <name> from <name>.parquet, or from <name>.csv which is then migrated to Parquet,
+    with the ETag of the Parquet snapshot it was read from (None if there is none yet).
+
+    The CSV object is left in place, readers of the Parquet file never look at it again.
+    """
+    df, etag = _get_df(bucket_name, f'{name}.parquet')
+    if df is not None:
+        return df, etag
+    df, _ = _get_df(bucket_name, f'{name}.csv')
+    if df is None:
+        return pd.DataFrame(), None
+    try:
+        etag = _put_df(df, bucket_name, f'{name}.parquet', if_none_match='*')
+    except (PreconditionFailed, ClientError, OSError):
+        return df, None  # Someone else migrated it first or the bucket is read-only, try again next load
+    return _typed_columns(df), etag
+
+
+@st.cache_resource
+def get_journal_state():
+    """Process-wide cache of journal deltas by key (they never change once written), the tables
+    being compacted, the single worker compacting them and the lock guarding it all."""
+    return {}, set(), ThreadPoolExecutor(max_workers=1), threading.Lock()
+
+
+def _journal_prefix(name):
+    return f'{name}.journal/'
+
+
+def _journal_of(key):
+    """The journal prefix the key is a delta under, or None."""
+    name, marker, _ = key.partition('.journal/')
+    return _journal_prefix(name) if marker else None
+
+
+def _list_journal(bucket_name, name):
+    """Keys and sizes of all the table's deltas, oldest first."""
+    return [(info.key, info.size) for info in iter_objects(bucket_name, _journal_prefix(name), None)]
+
+
+def _get_delta(bucket_name, key):
+    deltas, _, _, lock = get_journal_state()
+    with lock:
+        if (bucket_name, key) in deltas:
+            return deltas[(bucket_name, key)]
+    delta = json.loads(get_backend(bucket_name).get(key).body.read())
+    with lock:
+        deltas[(bucket_name, key)] = delta
+    return delta
+
+
+def _apply_delta(df, delta, totals):
+    """Apply one journal delta: a row upsert ('row' is None to append) or a schema change.
+
+    totals ({column: sum}) is updated in place from the changed cells only.
+    """
+    op = delta['op']
+    if op == 'upsert':
+        values = delta['values']
+        for col in values:
+            if col not in df.columns:
+                totals[col] = 0.0
+            df[col] = (df[col] if col in df.columns else pd.Series(pd.NA, index=df.index)).astype(object)
+        appended = delta['row'] is None or delta['row'] >= len(df)
+        for col, value in values.items():
+            if col in totals:
+                totals[col] += _amount(value) - (0.0 if appended else _amount(df.at[delta['row'], col]))
+        if appended:
+            return pd.concat([df, pd.DataFrame([values], dtype=object)], ignore_index=True)
+        for col, value in values.items():
+            df.at[delta['row'], col] = value
+    elif op == 'add_columns':
+        for col in delta['columns']:
+            if col not in df.columns:
+                df[col] = pd.NA
+                totals[col] = 0.0
+    elif op == 'rename_columns':
+        df = df.rename(columns=delta['columns'])
+        renamed = {delta['columns'][col]: totals.pop(col) for col in list(totals) if col in delta['columns']}
+        totals.update(renamed)
+    elif op == 'drop_columns':
+        df = df.drop(columns=[col for col in delta['columns'] if col in df.columns])
+        for col in delta['columns']:
+            totals.pop(col, None)
+    else:
+        raise ValueError(f"Unknown journal operation {op!r}")
+    return df
+
+
+def _merge_journal(bucket_name, name):
+    """The table's snapshot with its pending deltas applied, the ETag of that snapshot and the pending deltas.
+
+    Every delta in the journal that the snapshot does not list in df.attrs['journal_applied'] is
+    pending, whatever its key: a delta whose key sorts before ones already compacted (its PUT was
+    slow, or its writer's clock lags) is applied late rather than never. The keys of all listed
+    deltas become the merged frame's journal_applied.
+    The column totals of the snapshot are carried through the deltas into df.attrs['column_totals'],
+    so they cost as much as the deltas rather than a pass over the table.
+    """
+    df, etag = _read_table(bucket_name, name)
+    totals = df.attrs.get('column_totals')
+    if totals is None:
+        # Snapshot written before totals were kept, sum it once per cached copy until it is compacted
+        totals = _column_totals(df)
+        cached = _cached_df(bucket_name, f'{name}.parquet')
+        if cached and cached[0] == etag:
+            cached[1].attrs['column_totals'] = dict(totals)
+    totals = dict(totals)
+    applied = set(df.attrs.get('journal_applied', ()))
+    upto = df.attrs.pop('journal_upto', '')  # Snapshots from before journal_applied only know their last key
+    listed = _list_journal(bucket_name, name)
+    entries = [(key, size) for key, size in listed if key not in applied and key > upto]
+    tracing.count('journal.deltas', len(entries))
+    with tracing.span('journal.merge', table=name):
+        for key, _ in entries:
+            df = _apply_delta(df, _get_delta(bucket_name, key), totals)
+        if entries:
+            df = _typed_columns(df)
+            # Columns that only now turned numeric are summed once, text columns have no total
+            totals = {col: totals[col] if col in totals else float(df[col].sum()) for col in _numeric_columns(df)}
+    df.attrs['column_totals'] = totals
+    # Deltas deleted since drop out of the set, so it never grows past the journal itself
+    df.attrs['journal_applied'] = [key for key, _ in listed]
+    return df, etag, entries
+
+
+def compact_table(bucket_name, name):
+    """Fold the table's pending deltas into a new snapshot and delete them.
+
+    The snapshot records the keys of the deltas it contains and is only written if nobody replaced
+    the previous one meanwhile, so concurrent editors and compactions never lose a delta: one that
+    lands while this runs is not in the set and is still merged on read.
+    """
+    df, etag, entries = _merge_journal(bucket_name, name)
+    if not entries:
+        return False
+    try:
+        _put_df(df, bucket_name, f'{name}.parquet', if_match=etag, if_none_match=None if etag else '*')
+    except PreconditionFailed:
+        return False  # Another compaction won, its snapshot already holds these deltas
+    keys = list(df.attrs['journal_applied'])
+    get_backend(bucket_name).delete(keys)
+    deltas, _, _, lock = get_journal_state()
+    with lock:
+        for key in keys:
+            deltas.pop((bucket_name, key), None)
+    for key in keys:
+        _index_update(bucket_name, key, None)
+    return True
+
+
+def _compact_in_background(bucket_name, name):
+    _, compacting, executor, lock = get_journal_state()
+    with lock:
+        if (bucket_name, name) in compacting:
+            return
+        compacting.add((bucket_name, name))
+
+    def run():
+        try:
+            compact_table(bucket_name, name)
+        except Exception:
+            logger.exception("Compaction of %s failed", name)
+        finally:
+            with lock:
+                compacting.discard((bucket_name, name))
+    executor.submit(run)
+
+
+def _compact_if_due(bucket_name, name, entries):
+    if len(entries) >= JOURNAL_MAX_DELTAS or sum(size for _, size in entries) >= JOURNAL_MAX_BYTES:
+        _compact_in_background(bucket_name, name)
+
+
+def load_journaled_table(bucket_name, name):
+    """Load the table <name> with every edit appended to its journal."""
+    try:
+        df, _, entries = _merge_journal(bucket_name, name)
+    except Exception as e:
+        st.error(f"Error loading data from S3: {e}")
+        return pd.DataFrame()
+    _compact_if_due(bucket_name, name, entries)
+    return df
+
+
+def load_journaled_tables(bucket_name, names):
+    """Load several journaled tables at once, as {name: DataFrame}."""
+    merged = _fetch_all(_merge_journal, bucket_name, names)
+    tables = {}
+    for name, result in merged.items():
+        if result is None:
+            tables[name] = pd.DataFrame()
+            continue
+        tables[name], _, entries = result
+        _compact_if_due(bucket_name, name, entries)
+    return tables
+
+
+def append_to_journal(bucket_name, name, op, quiet=False, **fields):
+    """Store one edit of the table <name> as a delta object, the cost only depends on the edit's size.
+
+    Keys start with the write time so deltas apply in order, and end with a random suffix so
+    concurrent editors never overwrite each other. A delta is applied once it is listed, even if
+    its key sorts before deltas that were compacted already. quiet skips the confirmation, for bookkeeping
+    writes the user did not ask for.
+    """
+    key = f'{_journal_prefix(name)}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json'
+    delta = dict(op=op, **fields)
+    body = json.dumps(delta, default=str).encode('utf-8')
+    etag, size, _ = get_backend(bucket_name).put(key, [body], 'application/json')
+    _index_put(bucket_name, key, size, etag)
+    deltas, _, _, lock = get_journal_state()
+    with lock:
+        deltas[(bucket_name, key)] = json.loads(json.dumps(delta, default=str))
+    if not quiet:
+        st.success(f'Change saved to S3 successfully: {name}')
@@ -0,0 +1,197 @@
+"""Timed spans and counters of one rerun, exportable as a Chrome trace.
+
+main.py starts a Trace at the top of every rerun while tracing is switched on and makes it the
+current trace of the script thread; span() and count() record into it from anywhere, and cost a
+thread-local lookup when no trace is active. Work handed to a thread pool keeps recording into the
+rerun's trace if it is wrapped with bind(). Traces load in chrome://tracing or ui.perfetto.dev.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+_local = threading.local()
+
+
+class Trace:
+    """Spans as (name, thread, start ns, duration ns, args) and counter totals of one rerun."""
+
+    def __init__(self, name):
+        self.name = name
+        self.thread = threading.get_ident()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.wall_time = time.time()
+        self.spans = []
+        self.counters = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def add_span(self, name, start_ns, duration_ns, args):
+        with self.lock:
+            self.spans.append((name, threading.get_ident(), start_ns, duration_ns, args))
+
+    def add_count(self, name, value):
+        with self.lock:
+            self.counters[name] += value
+
+    def finish(self):
+        self.end_ns = time.perf_counter_ns()
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1e6
+
+    def breakdown(self):
+        """{span name: (calls, total ms)}, slowest first; nested spans count in their parents too."""
+        totals = defaultdict(lambda: [0, 0.0])
+        with self.lock:
+            spans = list(self.spans)
+        for name, _, _, duration_ns, _ in spans:
+            totals[name][0] += 1
+            totals[name][1] += duration_ns / 1e6
+        return _sorted_breakdown(totals)
+
+
+def _sorted_breakdown(totals):
+    return {name: (calls, ms) for name, (calls, ms) in sorted(totals.items(), key=lambda item: -item[1][1])}
+
+
+class Totals:
+    """Span and counter totals of every rerun of a session, kept after the reruns themselves are dropped."""
+
+    def __init__(self):
+        self.reruns = 0
+        self.duration_ms = 0.0
+        self.spans = defaultdict(lambda: [0, 0.0])
+        self.counters = defaultdict(float)
+
+    def add(self, trace):
+        self.reruns += 1
+        self.duration_ms += trace.duration_ms
+        for name, (calls, ms) in trace.breakdown().items():
+            self.spans[name][0] += calls
+            self.spans[name][1] += ms
+        for name, value in trace.counters.items():
+            self.counters[name] += value
+
+    def breakdown(self):
+        return _sorted_breakdown(self.spans)
+
+
+def breakdown_rows(breakdown):
+    """Rows of a span breakdown, for st.dataframe."""
+    return [{'span': name, 'calls': calls, 'total ms': round(ms, 2), 'ms per call': round(ms / calls, 3)}
+            for name, (calls, ms) in breakdown.items()]
+
+
+def counter_rows(counters):
+    return [{'counter': name, 'value': int(value) if float(value).is_integer() else value}
+            for name, value in sorted(counters.items())]
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'args', 'start_ns')
+
+    def __init__(self, trace, name, args):
+        self.trace = trace
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.trace.add_span(self.name, self.start_ns, time.perf_counter_ns() - self.start_ns, self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def current():
+    """The trace recording on this thread, None when tracing is off."""
+    return getattr(_local, 'trace', None)
+
+
+def activate(trace):
+    """Make trace (or None) the current trace of this thread and return the previous one."""
+    previous = current()
+    _local.trace = trace
+    return previous
+
+
+def span(name, **args):
+    """Context manager timing a block as a span of the current trace."""
+    trace = current()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name, args)
+
+
+def count(name, value=1):
+    trace = current()
+    if trace is not None:
+        trace.add_count(name, value)
+
+
+def traced(name=None):
+    """Decorator recording every call of a function as a span."""
+    def decorator(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind(fn):
+    """fn bound to the current trace, to run on another thread; fn itself when tracing is off."""
+    trace = current()
+    if trace is None:
+        return fn
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        previous = activate(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            activate(previous)
+    return bound
+
+
+def chrome_trace(traces):
+    """JSON in the Trace Event Format: every rerun a complete event with its spans nested under it,
+    spans of pool threads on tracks of their own, and the rerun's counters as counter events at its end."""
+    pid = os.getpid()
+    events = []
+    thread_ids = {}
+    for trace in traces:
+        end_ns = trace.end_ns or time.perf_counter_ns()
+        main_tid = thread_ids.setdefault(trace.thread, len(thread_ids))
+        events.append({'name': trace.name, 'cat': 'rerun', 'ph': 'X', 'pid': pid, 'tid': main_tid,
+                       'ts': trace.start_ns / 1e3, 'dur': (end_ns - trace.start_ns) / 1e3})
+        for name, thread, start_ns, duration_ns, args in trace.spans:
+            tid = thread_ids.setdefault(thread, len(thread_ids))
+            events.append({'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': start_ns / 1e3, 'dur': duration_ns / 1e3,
+                           'args': {key: str(value) for key, value in args.items()}})
+        for name, value in trace.counters.items():
+            events.append({'name': name, 'ph': 'C', 'pid': pid, 'tid': main_tid, 'ts': end_ns / 1e3, 'args': {name: value}})
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
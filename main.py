@@ -1,9 +1,12 @@
 import streamlit as st
-import importlib.util
+import importlib
 import os
 import sys
+import threading
+import types
+from collections import deque
 sys.path.append('./')
-from common import utils
+from common import tracing
 from common.config import loan_params
 
 st.set_page_config(page_title="My Expensensense App", layout="wide")
@@ -16,41 +19,141 @@ PAGE_MAPPING = {
     "Loan_selector": "Mortgage Optimizer",
 }
 
+# Imported in the background after the first page is drawn, so switching pages does not pay for them
+WARM_MODULES = ("numpy", "pandas", "plotly.express", "boto3", "pyarrow.parquet", "common.loan_calc", "common.storage")
+# Reruns kept for the trace panel and its export; tracing starts switched on when EXPENSENSE_TRACE is set
+TRACE_HISTORY = 20
+TRACE_DEFAULT = os.environ.get("EXPENSENSE_TRACE", "") not in ("", "0")
+
+
+@st.cache_resource
+def get_compiled_pages():
+    """Process-wide (mtime, code object) by page path, with the lock guarding them."""
+    return {}, threading.Lock()
+
+
+def compile_page(page_path, compiled):
+    """Code object of a page, compiled once per process and again only when the file changes.
+
+    Plain dict lookups rather than st.cache_resource, so the warm-up thread can compile pages
+    without a script run context.
+    """
+    pages, lock = compiled
+    mtime = os.path.getmtime(page_path)
+    with lock:
+        entry = pages.get(page_path)
+    if entry is not None and entry[0] == mtime:
+        return entry[1]
+    with open(page_path, encoding="utf-8") as f:
+        code = compile(f.read(), page_path, "exec")
+    with lock:
+        pages[page_path] = (mtime, code)
+    return code
+
+
 def load_module(page_path):
     try:
-        spec = importlib.util.spec_from_file_location("module.name", page_path)
-        module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(module)
+        code = compile_page(page_path, get_compiled_pages())
+        # Every page runs in a fresh module named after it, which tracebacks and errors show
+        name = f"pages.{os.path.splitext(os.path.basename(page_path))[0]}"
+        module = types.ModuleType(name)
+        module.__file__ = page_path
+        exec(code, module.__dict__)
         return module
     except Exception as e:
         st.error(f"Failed to load module {page_path}. Error: {str(e)}")
         return None
 
+
+def _warm_up(page_dir, compiled):
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    for page in PAGE_MAPPING:
+        page_path = os.path.join(page_dir, f"{page}.py")
+        if os.path.isfile(page_path):
+            compile_page(page_path, compiled)
+
+
+@st.cache_resource
+def start_warm_up(page_dir):
+    """Start importing the heavy libraries and compiling every page, once per process."""
+    thread = threading.Thread(target=_warm_up, args=(page_dir, get_compiled_pages()), name="page-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def record_trace(trace):
+    """Close the rerun's trace and keep it, with the session totals, in the session state."""
+    tracing.activate(None)
+    if trace is None:
+        return
+    trace.finish()
+    st.session_state.setdefault("traces", deque(maxlen=TRACE_HISTORY)).append(trace)
+    st.session_state.setdefault("trace_totals", tracing.Totals()).add(trace)
+
+
+def show_trace_panel():
+    """Sidebar switch for tracing, with where the last rerun and the whole session spent their time."""
+    with st.sidebar.expander("Performance trace"):
+        st.checkbox("Trace reruns", value=TRACE_DEFAULT, key="tracing")
+        traces = st.session_state.get("traces")
+        if not traces:
+            st.caption("Switch tracing on and interact with a page to record its reruns.")
+            return
+        last, totals = traces[-1], st.session_state["trace_totals"]
+        st.caption(f"Last rerun ({last.name}): {last.duration_ms:.0f} ms")
+        st.dataframe(tracing.breakdown_rows(last.breakdown()), use_container_width=True)
+        if last.counters:
+            st.dataframe(tracing.counter_rows(last.counters), use_container_width=True)
+        st.caption(f"Session: {totals.reruns} reruns, {totals.duration_ms:.0f} ms")
+        st.dataframe(tracing.breakdown_rows(totals.breakdown()), use_container_width=True)
+        if totals.counters:
+            st.dataframe(tracing.counter_rows(totals.counters), use_container_width=True)
+        st.download_button(f"Download last {len(traces)} reruns (Chrome trace)", tracing.chrome_trace(traces),
+                           file_name="expensense-trace.json", mime="application/json")
+
 # Sidebar navigation
 st.sidebar.title("Navigation")
 selection = st.sidebar.radio("Go to", options=list(PAGE_MAPPING.keys()), format_func=lambda x: PAGE_MAPPING[x])
 
+# Everything below, down to the page itself, is recorded while tracing is on
+trace = tracing.Trace(selection) if st.session_state.get("tracing", TRACE_DEFAULT) else None
+tracing.activate(trace)
+
 if selection == "Loan_selector":
+    from common.loan_calc import LoanSetup  # numpy is only needed from here on
     st.sidebar.header("Mortgage Optimizer Settings")
-    # Define inputs related to the mortgage optimizer
-    #if 'P1' not in st.session_state:
-    st.session_state['P1'] = st.sidebar.number_input("Principal Part 1", value=loan_params.principal_part1)
-    #if 'P2' not in st.session_state:
-    st.session_state['P2'] = st.sidebar.number_input("Principal Part 2", value=loan_params.principal_part2)
-    #if 'P3' not in st.session_state:
-    st.session_state['P3'] = st.sidebar.number_input("Principal Part 3", value=loan_params.principal_part3)
-    st.session_state['discount'] = st.sidebar.number_input("Discount Rate (%)", value=loan_params.discount_val)
-    st.session_state['base_rates'] = {
-        'float': st.sidebar.number_input("Float Rate (%)", value=loan_params.init_float_val),
-        'fixed_1_year': st.sidebar.number_input("Fixed 1 Year Rate (%)", value=loan_params.init_1_year_val),
-        'fixed_2_year': st.sidebar.number_input("Fixed 2 Year Rate (%)", value=loan_params.init_2_year_val),
-        'fixed_3_year': st.sidebar.number_input("Fixed 3 Year Rate (%)", value=loan_params.init_3_year_val)
-    }
+    # Define inputs related to the mortgage optimizer, the page reads them back as one LoanSetup
+    defaults = LoanSetup.from_config(loan_params)
+    default_rates = dict(defaults.base_rates)
+    st.session_state['loan'] = LoanSetup(
+        principals=tuple(st.sidebar.number_input(f"Principal Part {idx+1}", value=principal)
+                         for idx, principal in enumerate(defaults.principals)),
+        discount=st.sidebar.number_input("Discount Rate (%)", value=defaults.discount),
+        base_rates=(
+            ('float', st.sidebar.number_input("Float Rate (%)", value=default_rates['float'])),
+            ('fixed_1_year', st.sidebar.number_input("Fixed 1 Year Rate (%)", value=default_rates['fixed_1_year'])),
+            ('fixed_2_year', st.sidebar.number_input("Fixed 2 Year Rate (%)", value=default_rates['fixed_2_year'])),
+            ('fixed_3_year', st.sidebar.number_input("Fixed 3 Year Rate (%)", value=default_rates['fixed_3_year'])),
+        ),
+    )
 
 # Dynamic page loading
 current_script_dir = os.path.dirname(__file__)
 page_path = os.path.join(current_script_dir, f"sources/{selection}.py")
 if os.path.isfile(page_path):
-    page_module = load_module(page_path)
+    try:
+        with tracing.span("load_module", page=selection):
+            page_module = load_module(page_path)
+    finally:
+        record_trace(trace)  # Also when the page stops the script early to rerun it
 else:
+    record_trace(trace)
     st.error(f"Page not found: {selection}")
+show_trace_panel()
+
+# Everything the other pages need is loaded once this one has been drawn
+start_warm_up(os.path.join(current_script_dir, "sources"))
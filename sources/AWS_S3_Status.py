@@ -1,45 +1,36 @@
 import streamlit as st
-import boto3
-from io import StringIO
-
-# Function to list existing .csv files in the S3 bucket
-def list_csv_files(bucket_name):
-    s3_client = boto3.client('s3', aws_access_key_id=st.secrets["aws"]["access_key_id"],
-                             aws_secret_access_key=st.secrets["aws"]["secret_access_key"],
-                             region_name=st.secrets["aws"]["region"])
-    csv_files = []
-    try:
-        contents = s3_client.list_objects_v2(Bucket=bucket_name)['Contents']
-        for obj in contents:
-            if obj['Key'].endswith('.csv'):
-                csv_files.append(obj['Key'])
-    except KeyError:
-        st.error('No files found in the bucket.')
-    except Exception as e:
-        st.error(f"Error accessing bucket: {e}")
-    return csv_files
-
-# Function to add a new .csv file to the S3 bucket
-def add_csv_to_s3(bucket_name, file_path, csv_content=""):
-    s3_client = boto3.client('s3', aws_access_key_id=st.secrets["aws"]["access_key_id"],
-                             aws_secret_access_key=st.secrets["aws"]["secret_access_key"],
-                             region_name=st.secrets["aws"]["region"])
-    # Create a CSV file in S3
-    s3_client.put_object(Body=csv_content, Bucket=bucket_name, Key=file_path)
-    st.success(f"File {file_path} created in bucket {bucket_name}.")
+import sys
+sys.path.append('./')
+import pandas as pd
+from common import tracing
+from common.config import storage_params
+from common.storage import list_objects_indexed, add_csv_to_s3
 
 # Display title
 st.title('Existing in and adding to S3 bucket')
 
 # S3 bucket name
-bucket_name = 'streamlitbucketkamra34'
+bucket_name = storage_params.bucket_name
+# Number of files shown per page
+PAGE_SIZE = 50
 
 # Display existing .csv files
 st.subheader('Existing files in the bucket:')
-csv_files = list_csv_files(bucket_name)
+refresh = st.button("Refresh list")
+try:
+    with tracing.span('s3_status.list_files', refresh=refresh):
+        csv_files = list_objects_indexed(bucket_name, suffix='.csv', refresh=refresh)
+except Exception as e:
+    st.error(f"Error accessing bucket: {e}")
+    csv_files = []
 if csv_files:
-    for file in csv_files:
-        st.write(file)
+    # Only the selected page is rendered
+    n_pages = (len(csv_files) - 1) // PAGE_SIZE + 1
+    page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1, key="files_page")
+    shown = csv_files[(page - 1) * PAGE_SIZE:page * PAGE_SIZE]
+    st.dataframe(pd.DataFrame(shown, columns=['Key', 'Size', 'ETag', 'Last modified']).drop(columns='ETag'),
+                 hide_index=True, use_container_width=True)
+    st.caption(f"Files {(page - 1) * PAGE_SIZE + 1} to {(page - 1) * PAGE_SIZE + len(shown)} of {len(csv_files)}")
 else:
     st.write("No .csv files found.")
 
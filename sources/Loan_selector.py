@@ -2,17 +2,113 @@ import streamlit as st
 import numpy as np
 import pandas as pd
 import plotly.express as px
-import itertools
+import plotly.graph_objects as go
 import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, wait
 sys.path.append('./')
-from common import utils
-from common.config import loan_params
+from common import jobs, loan_calc, monte_carlo, tracing
+from common.scenarios import ScenarioStore, downsample_minmax
+
+# Above this many scenarios the scatter plot is drawn with WebGL from a min/max downsample, labels only on request
+HOVER_LABEL_LIMIT = 5000
+# Index buckets of the downsampled scatter plot, each drawn as its lowest and highest point
+PLOT_BUCKETS = 2000
+# Above this many scenarios the full grid is not computed or plotted
+MAX_GRID_SCENARIOS = 2_000_000
+# Seconds a rerun waits for a scenario job before drawing the last result instead, and between progress updates after
+JOB_INLINE_WAIT = 0.2
+JOB_POLL = 0.5
+
+
+@st.cache_resource
+def get_job_board():
+    """Scenario jobs of every session, computed on one pool per process."""
+    return jobs.JobBoard()
+
+
+def background(slot, fn, *args):
+    """fn(*args) computed on the job board, or the slot's last result while the job is still running.
+
+    Returns None when nothing was computed for the slot yet. Pending jobs get a progress line where
+    the section starts and are waited for at the end of the page.
+    """
+    session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex)
+    future = get_job_board().watch(session_id, slot, jobs.fingerprint(slot, *args), fn, *args)
+    wait([future], timeout=JOB_INLINE_WAIT)
+    if future.done():
+        st.session_state[f'job_{slot}'] = future.result()
+        return st.session_state[f'job_{slot}']
+    progress = st.empty()
+    progress.caption("Computing...")
+    pending_jobs.append((future, progress))
+    return st.session_state.get(f'job_{slot}')
+
+
+def wait_for_jobs(pending):
+    """Wait for the first pending job to finish, then rerun to draw it.
+
+    The progress lines are updated while waiting, which also lets Streamlit stop this run as soon as
+    an input changes; the next run then releases the jobs nobody needs any more.
+    """
+    start = time.monotonic()
+    with tracing.span('jobs.wait', jobs=len(pending)):
+        while not wait([future for future, _ in pending], timeout=JOB_POLL, return_when=FIRST_COMPLETED).done:
+            for _, progress in pending:
+                progress.caption(f"Computing... {time.monotonic() - start:.0f} s")
+    st.rerun()
+
+
+def evaluate_grid(loan, names, values, average_months):
+    """Monthly interest of every rate combination and discount placement, as a ScenarioStore."""
+    balances = loan.average_balances(average_months)
+    with tracing.span('combinations.compute', scenarios=len(values) ** len(balances) * len(balances)):
+        interests = loan_calc.compute_combination_interests(balances, values, loan.discount)
+    tracing.count('scenarios', len(interests))
+    return ScenarioStore.enumerate(len(balances), names, values, loan.discount, monthly_interest=interests)
+
+
+def evaluate_adjusted(loan, adjustment, top, rates):
+    """Best splits with rate adjustments and the re-fixing plan, with the inputs they were computed for."""
+    names, values = loan.rate_table(rates)
+    with tracing.span('adjusted.best_splits'):
+        splits = loan_calc.best_adjusted_splits(loan, adjustment, top, rates)
+    tracing.count('scenarios', len(names) ** len(loan.principals) * len(loan.principals))
+    with tracing.span('refixing.plan'):
+        plan = loan_calc.plan_refixing(loan, adjustment, rates)
+    return {'loan': loan, 'adjustment': adjustment, 'names': names, 'values': values, 'splits': splits, 'plan': plan}
+
+
+def evaluate_random_paths(loan, adjustment, stochastic, rates):
+    """Cost distribution of every split over random float paths, as a ScenarioStore with the paths it was computed for."""
+    names, values = loan.rate_table(rates)
+    store = ScenarioStore.enumerate(len(loan.principals), names, values, loan.discount)
+    with tracing.span('random_paths.evaluate', paths=stochastic.n_paths):
+        summary = monte_carlo.evaluate_splits(loan, adjustment, stochastic, store.codes.T, store.discounted(), rates)
+    tracing.count('scenarios', store.n_scenarios)
+    tracing.count('scenario_paths', store.n_scenarios * stochastic.n_paths)
+    percentiles = np.ascontiguousarray(summary['percentiles'].T)
+    store = store.with_columns(mean=summary['mean'], p5=percentiles[0], median=percentiles[1], p95=percentiles[2],
+                               **{f'beats_{name}': probability.astype(np.float32) for name, probability in summary['beat_fixed'].items()})
+    return {'stochastic': stochastic, 'store': store}
+
+
+def download_scenarios(store, file_name, key):
+    """Button exporting every scenario of the store as an Arrow file, only encoded once asked for."""
+    if st.button(f"Export all {store.n_scenarios:,} scenarios as Arrow", key=key):
+        st.download_button("Download", store.to_arrow_ipc(), file_name=file_name,
+                           mime="application/vnd.apache.arrow.file", key=f'{key}_download')
+
 
 st.title('Mortgage Re-Payments')
+# Scenario jobs still running after this run's inputs changed, with their progress lines
+pending_jobs = []
 # Input sections for each part of the mortgage
-rate_options = st.session_state['base_rates']
-discount = st.session_state['discount']
-mortgage_parts = [st.session_state['P1'], st.session_state['P2'], st.session_state['P3']]
+loan = st.session_state['loan']
+rate_options = dict(loan.base_rates)
+discount = loan.discount
+mortgage_parts = list(loan.principals)
 with st.container():
     col1, col2, col3 = st.columns(3, gap='large')
     with col1:
@@ -38,6 +134,12 @@ with st.container():
     with col2:
         amort_rate = st.number_input(f"Amortization rate", value=2, key = 'A1')
 
+    # Amortizing lowers the balance interest is charged on, in the optimizers below
+    declining_balance = st.checkbox("Charge interest on the declining balance", value=False, key='declining_balance',
+                                    help="Amortize every part at the amortization rate instead of paying interest on the full principal.")
+    if declining_balance:
+        loan = loan._replace(amort_rates=(amort_rate,) * len(mortgage_parts))
+
     # Apply the discount to the selected part
     if discount_part == 'Part 1':
         r1 -= discount
@@ -46,15 +148,13 @@ with st.container():
     elif discount_part == 'Part 3':
         r3 -= discount
 
-    P1 = st.session_state['P1']
-    P2 = st.session_state['P2']
-    P3 = st.session_state['P3']
+    P1, P2, P3 = mortgage_parts
 
     # Prepare inputs
     inputs = [(P1, r1), (P2, r2), (P3, r3)]
 
 with st.container():
-    interests = [utils.compute_interest(P, r) for P, r in inputs]
+    interests = [loan_calc.compute_interest(P, r) for P, r in inputs]
     interest_monthly = sum([M for M in interests])
     tot_mortgage = P1 + P2 + P3
     amort_percentage = amort_rate / 100
@@ -85,7 +185,8 @@ with st.container():
     df['Monthly'] = df['Monthly'].astype(int)
     df['Yearly'] = df['Yearly'].astype(int)
     #st.write(f"With an amortization of :red[{amort_rate}%]")
-    st.dataframe(df.T, use_container_width=True)
+    with tracing.span('render.monthly_table'):
+        st.dataframe(df.T, use_container_width=True)
 
 #####################################################################################################################
 ####################################### ALL POSSIBLE COMBINATIONS ###################################################
@@ -98,56 +199,90 @@ with st.expander("Dynamic Combinations"):
     # Filter `base_rates` to only include the rates that have been selected
     selected_base_rates = {rate: rate_options[rate] for rate in selected_rates}
 
-    # Generate all rate combinations for the selected mortgage parts
-    rate_combinations = list(itertools.product(selected_base_rates.items(), repeat=len(mortgage_parts)))
-
-    # Iterate through each combination and apply the discount to one part at a time
-    results = []
-    labels = []
-    for rates in rate_combinations:
-        for i in range(len(mortgage_parts)):
-            # Apply discount to the ith part
-            discounted_rates = [rate - discount if idx == i else rate for idx, (_, rate) in enumerate(rates)]
-            scenario = ", ".join(f"Part {idx+1}: {name} @ {rate:.2f}%" for idx, ((name, _), rate) in enumerate(zip(rates, discounted_rates)))
-            total_interest = sum(utils.compute_monthly_interest(mortgage, rate) for mortgage, rate in zip(mortgage_parts, discounted_rates))
-            labels.append(scenario)
-            results.append(total_interest)
-
-    # Create a DataFrame for results
-    df_results = pd.DataFrame({
-        'Scenario Index': list(range(len(results))),
-        'Monthly Interest (kr)': results,
-        'Scenario': labels
-    })
-
-    df_results['Monthly Interest (kr)'] = df_results['Monthly Interest (kr)'].astype(int)
-
-    # Plotting using Plotly
-    fig = px.scatter(df_results, x='Scenario Index', y='Monthly Interest (kr)',
-                    hover_data=['Scenario'], labels={'Scenario Index': 'Combination Index'})
-    fig.update_traces(mode='markers+lines', textposition='top center')
-    fig.update_layout(
-        title='Total Monthly Interest for Each Configuration',
-        xaxis_title='Combination Index',
-        yaxis_title='Total Monthly Interest (kr)',
-        hovermode='closest'
-    )
-
-    # Display in Streamlit
-    st.plotly_chart(fig, use_container_width=True)
-
-    # Sort by monthly interest and take the top N
+    # Evaluate every rate combination and discount placement in one batch, in the background
+    selected_names = list(selected_base_rates.keys())
+    selected_values = list(selected_base_rates.values())
+    average_months = None
+    if loan.amort_rates:
+        average_months = st.number_input("Average the monthly interest over months", value=12, min_value=1, key='average_months')
+    n_scenarios = len(selected_values) ** len(mortgage_parts) * len(mortgage_parts)
+    if not selected_values:
+        grid = None
+        st.info("Select at least one rate to compare combinations.")
+    elif n_scenarios <= MAX_GRID_SCENARIOS:
+        grid = background('combinations', evaluate_grid, loan, tuple(selected_names), tuple(selected_values), average_months)
+    else:
+        grid = None
+        st.info(f"{n_scenarios:,} combinations are too many to plot, only the top scenarios are shown.")
+    if grid is not None and grid.n_scenarios <= HOVER_LABEL_LIMIT:
+        # Create a DataFrame for results
+        df_results = pd.DataFrame({
+            'Scenario Index': np.arange(grid.n_scenarios),
+            'Monthly Interest (kr)': grid.columns['monthly_interest'].astype(int),
+            'Scenario': grid.labels(range(grid.n_scenarios)),
+        })
+
+        with tracing.span('render.combinations_plot', points=len(df_results)):
+            # Plotting using Plotly
+            fig = px.scatter(df_results, x='Scenario Index', y='Monthly Interest (kr)',
+                            hover_data=['Scenario'], labels={'Scenario Index': 'Combination Index'})
+            fig.update_traces(mode='markers+lines', textposition='top center')
+            fig.update_layout(
+                title='Total Monthly Interest for Each Configuration',
+                xaxis_title='Combination Index',
+                yaxis_title='Total Monthly Interest (kr)',
+                hovermode='closest'
+            )
+
+            # Display in Streamlit
+            st.plotly_chart(fig, use_container_width=True)
+    elif grid is not None:
+        # Too many points to send one by one: the chosen index range is bucketed on the server and
+        # every bucket drawn as its lowest and highest scenario, with WebGL and without labels
+        interests = grid.columns['monthly_interest']
+        first, last = st.slider("Combination Index range", min_value=0, max_value=grid.n_scenarios - 1,
+                                value=(0, grid.n_scenarios - 1), key='plot_range')
+        with tracing.span('render.combinations_plot', points=last - first + 1):
+            index = first + downsample_minmax(interests[first:last + 1], PLOT_BUCKETS)
+            fig = go.Figure(go.Scattergl(x=index, y=interests[index].astype(int), mode='markers+lines',
+                                         hovertemplate='Combination Index %{x}<br>%{y} kr<extra></extra>'))
+            fig.update_layout(
+                title='Total Monthly Interest for Each Configuration',
+                xaxis_title='Combination Index',
+                yaxis_title='Total Monthly Interest (kr)',
+                hovermode='closest'
+            )
+            st.plotly_chart(fig, use_container_width=True)
+        st.caption(f"{len(index):,} of {last - first + 1:,} combinations drawn, the lowest and highest of every "
+                   f"{-(-(last - first + 1) // PLOT_BUCKETS):,} in a row. Narrow the range to see them all.")
+
+        # Only the inspected combination is labelled
+        inspected = st.number_input("Inspect Combination Index", min_value=0, max_value=grid.n_scenarios - 1,
+                                    value=int(grid.top('monthly_interest', 1)[0]), key='inspect_combination')
+        st.write(f"{grid.labels([inspected])[0]}: {int(interests[inspected]):,} kr")
+    if grid is not None:
+        download_scenarios(grid, 'combinations.arrow', 'export_combinations')
+
+    # Take the top N straight from the per-part costs, without ranking every combination
     st.header("Top Scenarios with Lowest Monthly Interest")
     topN = st.slider("Selct number of top scenarios",min_value = 1, max_value = 40, value=10, key='topN')
-    top_scenarios = df_results.sort_values(by='Monthly Interest (kr)').head(topN)
+    with tracing.span('combinations.top'):
+        top_codes, top_discounted, top_totals = loan_calc.best_monthly_splits(loan, topN, selected_names, average_months)
+    top_index = [loan_calc.combination_index(codes, len(selected_values), part) for codes, part in zip(top_codes, top_discounted)]
+    top_scenarios = pd.DataFrame({
+        'Scenario Index': top_index,
+        'Monthly Interest (kr)': top_totals.astype(int),
+        'Scenario': [loan_calc.describe_split(codes, part, selected_names, selected_values, discount) for codes, part in zip(top_codes, top_discounted)],
+    }, index=top_index)
 
     # Display the top 10 scenarios
     st.table(top_scenarios)
 
-    fig = px.bar(top_scenarios, x='Scenario', y='Monthly Interest (kr)',
-                title="Top 10 Scenarios with Lowest Monthly Interest",
-                labels={'Scenario': 'Rate Configuration', 'Monthly Interest (kr)': 'Monthly Interest (kr)'})
-    st.plotly_chart(fig)
+    with tracing.span('render.top_plot'):
+        fig = px.bar(top_scenarios, x='Scenario', y='Monthly Interest (kr)',
+                    title="Top 10 Scenarios with Lowest Monthly Interest",
+                    labels={'Scenario': 'Rate Configuration', 'Monthly Interest (kr)': 'Monthly Interest (kr)'})
+        st.plotly_chart(fig)
 
 #####################################################################################################################
 ################################################# Calculate scenarios including rate adjustments#####################
@@ -157,9 +292,6 @@ with st.expander("Simulate Rate Adjustments - every 3 months"):
     # Define mortgage parts (assumed to be defined globally or fetched similarly)
     selected_rates_adj = st.multiselect("Select which rates to include:", options=list(rate_options.keys()), default=list(rate_options.keys()), key = 'adj')
 
-    # Filter `base_rates` to only include the rates that have been selected
-    selected_base_rates_adj = {rate: rate_options[rate] for rate in selected_rates_adj}
-
     col1, col2, col3= st.columns(3, gap='large')
     with col1:
         monthly_dec = st.number_input("Rate adjustments (every 3 months)", value=0.25)
@@ -169,57 +301,127 @@ with st.expander("Simulate Rate Adjustments - every 3 months"):
         duration = st.number_input("Simulation in months", value=24)
 
 
-    # Generate all rate combinations for the selected mortgage parts
-    rate_combinations_adj = list(itertools.product(selected_base_rates_adj.items(), repeat=len(mortgage_parts)))
-
-    all_results_adj = []
-    detailed_interests_all = []
-    for rates in itertools.product(selected_base_rates_adj.items(), repeat=len(mortgage_parts)):
-        for i in range(len(mortgage_parts)):
-            # Apply discount to the ith part
-            discounted_rates_adj = [(name, rate, 1 if idx == i else 0) for idx, (name, rate) in enumerate(rates)]
-            #print(discounted_rates_adj)
-            total_interest_adj, scenario_adj, final_rates_adj, detailed_interests = utils.compute_total_interest_and_final_rates(mortgage_parts, discounted_rates_adj, discount, monthly_dec, final_float_rate, duration)
-            
-             # Prepare detailed interests text or structured data
-            detailed_interests_text = "; ".join([f"Part {idx+1}: " + ", ".join([f"Rate: {rate:.2f}%, Interest: {interest:.2f}" for rate, interest in part]) for idx, part in enumerate(detailed_interests)])
-
-            detailed_dict = {}
-            for idx, part in enumerate(detailed_interests):
-                for rate, interest in part:
-                    detailed_dict[f'Part {idx+1} Rate (%)'] = rate
-                    detailed_dict[f'Part {idx+1} Interest (kr)'] = interest
-
-            all_results_adj.append({
-            'Scenario': scenario_adj,
-            'Discount on': f"Part {i+1}",
-            'Final Rates': final_rates_adj,
-            'Total Interest Paid (kr)': total_interest_adj,
-            'Detailed Interests': detailed_interests_text
-            })
-
-            detailed_interests_all.append({
-            **detailed_dict  # Expand the detailed interests directly into the dictionary
-        })
-
-    df_details_adj = pd.DataFrame(all_results_adj)
-    df_results_adj = df_details_adj.drop(['Detailed Interests'], axis =1)
-
-    
     topN_adj = st.slider("Selct number of top scenarios",min_value = 1, max_value = 20, value=5, key='topN_adj')
-    top_scenarios_adj = df_results_adj.sort_values(by='Total Interest Paid (kr)').head(topN_adj)  
-    st.header(f"Top {topN_adj} Scenarios with Lowest Total Interest Paid Over {duration} Months")
-    st.table(top_scenarios_adj)
-
-    if 'show_df' not in st.session_state:
-        st.session_state['show_df'] = False
 
-    if st.button('See detailed adjusted monthly rates'):
-        st.session_state['show_df'] = not st.session_state['show_df']
+    # Cost of every part on every rate, then the best splits without enumerating every combination, in the background
+    adjustment = loan_calc.RateAdjustment(monthly_dec, final_float_rate, duration)
+    if selected_rates_adj:
+        adjusted = background('adjusted', evaluate_adjusted, loan, adjustment, topN_adj, tuple(selected_rates_adj))
+    else:
+        adjusted = None
+        st.info("Select at least one rate to simulate rate adjustments.")
+    if adjusted is not None:
+        # Everything below describes the inputs the shown result was computed for
+        loan_adj, adjustment_adj = adjusted['loan'], adjusted['adjustment']
+        rate_names_adj, rate_values_adj = adjusted['names'], adjusted['values']
+        codes_adj, discounted_parts_adj, totals_adj = adjusted['splits']
+
+        # Only the winning splits are described, and only their final rates are needed for the summary
+        rate_types_adj = rate_names_adj[codes_adj]
+        start_rates_adj = rate_values_adj[codes_adj]
+        discounted_adj = np.arange(len(loan_adj.principals)) == discounted_parts_adj[:, None]
+        final_rates_adj = loan_calc.compute_final_rates(rate_types_adj, start_rates_adj, discounted_adj, loan_adj.discount,
+                                                        loan_adj.float_rate, *adjustment_adj)
+        scenario_index_adj = [loan_calc.combination_index(codes, len(rate_names_adj), part) for codes, part in zip(codes_adj, discounted_parts_adj)]
+        scenarios_adj = [loan_calc.describe_scenario(zip(rate_types_adj[s], start_rates_adj[s], discounted_adj[s])) for s in range(len(codes_adj))]
+        top_scenarios_adj = pd.DataFrame({
+            'Scenario': scenarios_adj,
+            'Discount on': [f"Part {part + 1}" for part in discounted_parts_adj],
+            'Final Rates': [loan_calc.describe_final_rates(rates) for rates in final_rates_adj],
+            'Total Interest Paid (kr)': totals_adj,
+        }, index=scenario_index_adj)
+        st.header(f"Top {len(codes_adj)} Scenarios with Lowest Total Interest Paid Over {adjustment_adj.duration} Months")
+        st.table(top_scenarios_adj)
+
+        if 'show_df' not in st.session_state:
+            st.session_state['show_df'] = False
+
+        if st.button('See detailed adjusted monthly rates'):
+            st.session_state['show_df'] = not st.session_state['show_df']
+
+        if st.session_state['show_df']:
+            # Simulate the winning splits quarter by quarter for their detailed rates
+            with tracing.span('adjusted.details'):
+                path_rates_adj, path_interests_adj, part_totals_adj, _, _ = loan_calc.simulate_rate_paths(
+                    loan_adj.principals, rate_types_adj, start_rates_adj, discounted_adj, loan_adj.discount, loan_adj.float_rate,
+                    *adjustment_adj, amort_rates=loan_adj.amort_rates or None)
+            detailed_interests_adj = []
+            for s in range(len(codes_adj)):
+                detailed_interests = [loan_calc.collapse_rate_path(path_rates_adj[s, idx], path_interests_adj[s, idx], part_totals_adj[s, idx],
+                                                               loan_calc.fixed_term_months(rate_type))
+                                      for idx, rate_type in enumerate(rate_types_adj[s])]
+                detailed_interests_adj.append("; ".join([f"Part {idx+1}: " + ", ".join([f"Rate: {rate:.2f}%, Interest: {interest:.2f}" for rate, interest in part]) for idx, part in enumerate(detailed_interests)]))
+
+            top_scenarios_details = pd.DataFrame({
+                'Scenario': scenarios_adj,
+                'Discount on': top_scenarios_adj['Discount on'],
+                'Detailed Interests': detailed_interests_adj,
+            }, index=scenario_index_adj)
+            st.table(top_scenarios_details)
 
-    df_details_interests = pd.DataFrame(detailed_interests_all)  # ensure it is being created correctly
+#####################################################################################################################
+################################################# Re-fix each part when its term ends ##############################
+#####################################################################################################################
+st.header('Loan Optimizaer - Re-fixing Plan')
+with st.expander("Choose a new rate every time a term ends"):
+    st.write("Uses the rates, rate adjustment, lowest float rate and simulation length selected above. "
+             "Fixed rates are assumed to move with the float rate.")
+    # Computed with the best splits above
+    if adjusted is not None:
+        discounted_part_plan, plans, plan_costs, plan_total = adjusted['plan']
+        df_plan = pd.DataFrame({
+            'Plan': [loan_calc.describe_plan(plan) for plan in plans],
+            'Discount': [part == discounted_part_plan for part in range(len(plans))],
+            'Total Interest Paid (kr)': plan_costs,
+        }, index=[f"Part {part+1}" for part in range(len(plans))])
+        st.table(df_plan)
+        if len(totals_adj):
+            st.write(f"Total interest paid over {adjustment_adj.duration} months: {plan_total:,.0f} kr, "
+                     f"{totals_adj[0] - plan_total:,.0f} kr less than the best split fixed at the start.")
 
-    if st.session_state['show_df']:
-        top_scenarios_details = df_details_adj.sort_values(by='Total Interest Paid (kr)').head(topN_adj)
-        top_scenarios_details = top_scenarios_details.drop(['Final Rates', 'Total Interest Paid (kr)'], axis = 1)
-        st.table(top_scenarios_details)
+#####################################################################################################################
+################################################# Calculate scenarios over random rate paths #########################
+#####################################################################################################################
+st.header('Loan Optimizaer - Random Rate Paths')
+with st.expander("Simulate random float rates - every 3 months"):
+    st.write("Uses the rates, rate adjustment, lowest float rate and simulation length selected above.")
+    col1, col2, col3, col4, col5 = st.columns(5, gap='large')
+    with col1:
+        rate_model = st.selectbox("Rate model", monte_carlo.MODELS, format_func=lambda x: x.replace('_', ' ').capitalize())
+    with col2:
+        volatility = st.number_input("Volatility every 3 months (%)", value=0.15, min_value=0.0)
+    with col3:
+        reversion = st.number_input("Mean reversion every 3 months", value=0.2, min_value=0.0, max_value=1.0,
+                                    disabled=rate_model != 'mean_reverting')
+    with col4:
+        n_paths = st.number_input("Number of paths", value=2000, min_value=100, step=1000)
+    with col5:
+        seed = st.number_input("Seed", value=0, min_value=0)
+    stochastic = monte_carlo.StochasticRates(rate_model, volatility, reversion, int(n_paths), int(seed))
+    topN_mc = st.slider("Selct number of top scenarios", min_value=1, max_value=20, value=5, key='topN_mc')
+
+    # Every split against every path in the background, only the cost distribution per split is kept
+    random_paths = None
+    if selected_rates_adj:
+        random_paths = background('random_paths', evaluate_random_paths, loan, adjustment, stochastic, tuple(selected_rates_adj))
+    if random_paths is not None:
+        # Only the top rows are ranked and labelled
+        store_mc = random_paths['store']
+        top_index_mc = store_mc.top('mean', topN_mc)
+        columns_mc = {name: column[top_index_mc] for name, column in store_mc.columns.items()}
+        top_mc = pd.DataFrame({
+            'Scenario': [loan_calc.describe_scenario(store_mc.parts(s)) for s in top_index_mc],
+            'Discount on': [f"Part {store_mc.discounted_part[s] + 1}" for s in top_index_mc],
+            'Mean Interest (kr)': columns_mc['mean'],
+            '5th Percentile (kr)': columns_mc['p5'],
+            'Median (kr)': columns_mc['median'],
+            '95th Percentile (kr)': columns_mc['p95'],
+            **{f"P(beats {name[len('beats_'):]})": column for name, column in columns_mc.items() if name.startswith('beats_')},
+        }, index=top_index_mc)
+        st.header(f"Top {topN_mc} Scenarios with Lowest Mean Interest over {random_paths['stochastic'].n_paths} Paths")
+        st.table(top_mc)
+        download_scenarios(store_mc, 'random_paths.arrow', 'export_random_paths')
+
+# Results for the current inputs replace the last ones as soon as they are ready
+if pending_jobs:
+    wait_for_jobs(pending_jobs)
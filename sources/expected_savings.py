@@ -1,43 +1,22 @@
 import streamlit as st
 import pandas as pd
-import boto3
-from io import StringIO
-
-def save_df_to_s3(df, bucket_name, file_path):
-    """Convert DataFrame to CSV and upload to S3."""
-    csv_buffer = StringIO()
-    df.to_csv(csv_buffer, index=False)
-    s3_resource = boto3.resource('s3')
-    s3_resource.Object(bucket_name, file_path).put(Body=csv_buffer.getvalue())
-    st.success(f'DataFrame saved to S3 successfully: {file_path}')
-
-def load_df_from_s3(bucket_name, file_path):
-    """Load a DataFrame from a CSV file on S3."""
-    s3_client = boto3.client('s3', aws_access_key_id=st.secrets["aws"]["access_key_id"],
-                             aws_secret_access_key=st.secrets["aws"]["secret_access_key"],
-                             region_name=st.secrets["aws"]["region"])
-    try:
-        csv_obj = s3_client.get_object(Bucket=bucket_name, Key=file_path)
-        body = csv_obj['Body']
-        csv_string = body.read().decode('utf-8')
-        if csv_string.strip() == "":
-            return pd.DataFrame()  # Return an empty DataFrame if the file is empty
-        else:
-            df = pd.read_csv(StringIO(csv_string))
-            return df
-    except s3_client.exceptions.NoSuchKey:
-        return pd.DataFrame()  # Return an empty DataFrame if the file does not exist
-    except Exception as e:
-        st.error(f"Error loading data from S3: {e}")
-        return pd.DataFrame()
+import sys
+sys.path.append('./')
+from common import savings, tracing
+from common.config import storage_params
+from common.storage import append_to_journal, load_journaled_tables
 
 st.title('Expected Monthly Savings')
 
+bucket_name = storage_params.bucket_name
+# Edits that change the totals record them as this month's row of the savings history
+this_month = pd.Timestamp.now().to_period('M')
 
-df_income = load_df_from_s3('streamlitbucketkamra34', 'expected_income.csv')
-df_expenses = load_df_from_s3('streamlitbucketkamra34', 'expected_expenses.csv')
-print(df_income)
-print(df_expenses)
+# Fetch both tables up front and in parallel
+with tracing.span('savings.load_tables'):
+    tables = load_journaled_tables(bucket_name, [savings.INCOME_TABLE, savings.EXPENSES_TABLE, savings.HISTORY_TABLE])
+df_income = tables[savings.INCOME_TABLE]
+df_expenses = tables[savings.EXPENSES_TABLE]
 
 st.subheader(":orange[Current income]")
 st.dataframe(df_income)
@@ -52,11 +31,11 @@ with st.container(border=True):
 
         # Load the corresponding DataFrame
         if data_choice == "Income":
-            file_path = 'expected_income.csv'
+            table_name = 'expected_income'
         else:
-            file_path = 'expected_expenses.csv'
+            table_name = 'expected_expenses'
 
-        df = load_df_from_s3('streamlitbucketkamra34', file_path)
+        df = tables[table_name].copy()
         col1, col2, col3 = st.columns(3, gap='large')
         with col1:
             # Display the selected DataFrame or indicate it's empty
@@ -70,8 +49,7 @@ with st.container(border=True):
                 new_cols = st.text_input("Enter column names, separated by commas", key="new_cols")
                 if st.button("Create Columns"):
                     col_names = [x.strip() for x in new_cols.split(',')]
-                    df = pd.DataFrame(columns=col_names)
-                    save_df_to_s3(df, 'streamlitbucketkamra34', file_path)
+                    append_to_journal(bucket_name, table_name, 'add_columns', columns=col_names)
                     st.rerun()  # Rerun the app to refresh the state with the new DataFrame
             else:
                 # For non-empty DataFrame, provide editing options
@@ -84,25 +62,24 @@ with st.container(border=True):
                     new_columns.append(new_col)
             # Save button to apply changes
             if st.button("Rename Columns"):
-                # Apply any column renamings
-                df.columns = new_columns            
-                # Save the updated DataFrame back to S3
-                save_df_to_s3(df, 'streamlitbucketkamra34', file_path)
+                # Record any column renamings
+                renames = {old: new for old, new in zip(df.columns, new_columns) if old != new}
+                if renames:
+                    append_to_journal(bucket_name, table_name, 'rename_columns', columns=renames)
                 st.rerun()
         with col2:
             # Option to add a new column
             new_col_name = st.text_input("Add (leave blank if not):", key="add_new_col") 
             # Save button to apply changes
             if st.button("Add column"):
-                # Apply any column renamings
-                df.columns = new_columns
-            
+                # Record any column renamings
+                renames = {old: new for old, new in zip(df.columns, new_columns) if old != new}
+                if renames:
+                    append_to_journal(bucket_name, table_name, 'rename_columns', columns=renames)
+
                 # Add new column if specified
                 if new_col_name:
-                    df[new_col_name] = pd.NA  # or appropriate default value
-            
-                # Save the updated DataFrame back to S3
-                save_df_to_s3(df, 'streamlitbucketkamra34', file_path)
+                    append_to_journal(bucket_name, table_name, 'add_columns', columns=[new_col_name])
                 st.rerun()
         with col3:
             # Option to delete a column
@@ -112,10 +89,8 @@ with st.container(border=True):
             if st.button("Delete Columns"):            
                 # Delete selected column if specified
                 if col_to_delete:
-                    df = df.drop(columns=[col_to_delete])
-            
-                # Save the updated DataFrame back to S3
-                save_df_to_s3(df, 'streamlitbucketkamra34', file_path)
+                    append_to_journal(bucket_name, table_name, 'drop_columns', columns=[col_to_delete])
+                    savings.record_totals(bucket_name, str(this_month))
                 st.rerun()
 
 # Initialize session state for new row data if it doesn't already exist
@@ -132,11 +107,11 @@ with st.container(border=True):
             row_data_choice = st.radio("Select data to edit rows in:", ("Income", "Expenses"), key="row_data_choice")
 
             if row_data_choice == "Income":
-                file_path = 'expected_income.csv'
+                table_name = 'expected_income'
             else:
-                file_path = 'expected_expenses.csv'
+                table_name = 'expected_expenses'
 
-            df_to_edit = load_df_from_s3('streamlitbucketkamra34', file_path)
+            df_to_edit = tables[table_name].copy()
 
             # Select a row to edit
             row_to_edit = st.selectbox("Select a row to edit (by index):", options=range(len(df_to_edit)), key="row_to_edit_index")
@@ -151,14 +126,16 @@ with st.container(border=True):
                 st.session_state['edit_row_data'][col] = st.text_input(f"New value for {col}", value=str(st.session_state['edit_row_data'][col]), key=f"edit_{col}")
 
             if st.button("Save Edited Row"):
-                # Update the DataFrame with edited values
-                for col, value in st.session_state['edit_row_data'].items():
-                    df_to_edit.at[row_to_edit, col] = value
-
-                # Save changes and reset session state for the next edit
-                save_df_to_s3(df_to_edit, 'streamlitbucketkamra34', file_path)
-                del st.session_state['edit_row_data']
-                st.rerun()
+                # Values are stored as numbers, so the columns stay numeric and their totals exact
+                values, invalid = savings.parse_amounts(st.session_state['edit_row_data'])
+                if invalid:
+                    st.error(f"Not a number: {', '.join(invalid)}")
+                else:
+                    # Save the edited values and reset session state for the next edit
+                    append_to_journal(bucket_name, table_name, 'upsert', row=row_to_edit, values=values)
+                    savings.record_totals(bucket_name, str(this_month))
+                    del st.session_state['edit_row_data']
+                    st.rerun()
         with col2:
             st.subheader("Add new Row")
             # Form for adding a new row
@@ -167,15 +144,18 @@ with st.container(border=True):
                 submit_button = st.form_submit_button(label='Save New Row')
 
             if submit_button:
-                new_row_series = pd.Series(new_row_data)
-                df_to_edit = pd.concat([df_to_edit, pd.DataFrame([new_row_series])], ignore_index=True)
-                save_df_to_s3(df_to_edit, 'streamlitbucketkamra34', file_path)
-                st.rerun()
+                values, invalid = savings.parse_amounts(new_row_data)
+                if invalid:
+                    st.error(f"Not a number: {', '.join(invalid)}")
+                else:
+                    append_to_journal(bucket_name, table_name, 'upsert', row=None, values=values)
+                    savings.record_totals(bucket_name, str(this_month))
+                    st.rerun()
 
     
-# Sum up total income and expenses
-total_income = int(df_income.sum().sum())  # Summing twice to get the total of all values
-total_expenses = int(df_expenses.sum().sum())
+# Sum up total income and expenses from the column totals kept with the tables
+total_income = int(savings.table_total(df_income))
+total_expenses = int(savings.table_total(df_expenses))
 
 # Calculate the difference
 difference = total_income - total_expenses
@@ -190,3 +170,19 @@ df_summary = pd.DataFrame({
 # Display the summary DataFrame
 st.title("Summary")
 st.table(df_summary)
+
+# Totals per category (column) of each table
+col1, col2 = st.columns(2, gap='large')
+with col1:
+    st.dataframe(pd.Series(savings.column_totals(df_income), name='Income (kr)', dtype=float).astype(int))
+with col2:
+    st.dataframe(pd.Series(savings.column_totals(df_expenses), name='Expenses (kr)', dtype=float).astype(int))
+
+# The savings of any range of months come from the running sums of the history, which starts with
+# the current totals on a bucket where nothing has been edited since it was introduced
+history = tables[savings.HISTORY_TABLE]
+if history.empty:
+    history = savings.record_month(bucket_name, history, str(this_month), total_income, total_expenses)
+last_year = savings.savings_between(history, str(this_month - 11), str(this_month))
+st.metric("Expected savings over the last 12 months", f"{last_year:,.0f} kr",
+          help=f"Sum of the expected monthly savings recorded from {this_month - 11} to {this_month}.")
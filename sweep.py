@@ -0,0 +1,132 @@
+"""Headless parameter sweep of the mortgage optimizer.
+
+Evaluates the best mortgage splits for every combination of rate decrement, float floor,
+horizon, discount and principals, spread over all cores, and streams the results to a
+Parquet file as chunks finish.
+
+    python sweep.py --monthly-dec 0:0.5:0.05 --final-float-rate 2:4:0.25 --duration 12,24,36,60
+"""
+import argparse
+import itertools
+import os
+import sys
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+sys.path.append('./')
+from common import loan_calc
+
+COLUMNS = ['principals', 'discount', 'monthly_dec', 'final_float_rate', 'duration',
+           'rank', 'scenario', 'discount_on', 'total_interest']
+
+
+def parse_values(spec, cast=float):
+    """Values of a 'start:stop:step' range (stop included) or a comma separated list."""
+    if ':' in spec:
+        start, stop, step = (float(x) for x in spec.split(':'))
+        values = np.arange(start, stop + step / 2, step)
+        return [cast(round(value, 10)) for value in values]
+    return [cast(value) for value in spec.split(',')]
+
+
+def parse_principals(spec):
+    return tuple(float(value) for value in spec.split(','))
+
+
+def evaluate_cells(base_setup, cells, rate_names, top):
+    """Best splits of every (principals, discount, monthly_dec, final_float_rate, duration) cell, as columns."""
+    columns = {name: [] for name in COLUMNS}
+    for principals, discount, monthly_dec, final_float_rate, duration in cells:
+        setup = base_setup._replace(principals=principals, discount=discount)
+        adjustment = loan_calc.RateAdjustment(monthly_dec, final_float_rate, duration)
+        names, values = setup.rate_table(rate_names)
+        codes, discounted_parts, totals = loan_calc.best_adjusted_splits(setup, adjustment, top, rate_names)
+        for rank, (split, part, total) in enumerate(zip(codes, discounted_parts, totals)):
+            flags = np.arange(len(principals)) == part
+            columns['principals'].append([float(principal) for principal in principals])
+            columns['discount'].append(discount)
+            columns['monthly_dec'].append(monthly_dec)
+            columns['final_float_rate'].append(final_float_rate)
+            columns['duration'].append(duration)
+            columns['rank'].append(rank + 1)
+            columns['scenario'].append(loan_calc.describe_scenario(zip(names[split], values[split], flags)))
+            columns['discount_on'].append(int(part) + 1)
+            columns['total_interest'].append(float(total))
+    return columns
+
+
+def run_sweep(base_setup, cells, output, rate_names=None, top=1, workers=None, chunk_size=64):
+    """Evaluate the cells on a process pool and append each finished chunk to a Parquet file.
+
+    At most two chunks per worker are in flight, so memory stays bounded however large the grid.
+    Returns the best row of every horizon.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    workers = workers or os.cpu_count()
+    chunks = (cells[i:i + chunk_size] for i in range(0, len(cells), chunk_size))
+    best_by_duration = {}
+    writer = None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for chunk in itertools.chain(chunks, [None]):
+                if chunk is not None:
+                    pending.add(executor.submit(evaluate_cells, base_setup, chunk, rate_names, top))
+                    if len(pending) < 2 * workers:
+                        continue
+                done, pending = wait(pending, return_when=FIRST_COMPLETED if chunk is not None else ALL_COMPLETED)
+                for future in done:
+                    columns = future.result()
+                    table = pa.table(columns)
+                    if writer is None:
+                        writer = pq.ParquetWriter(output, table.schema, compression='zstd')
+                    writer.write_table(table)
+                    for row in table.filter(pc.equal(table['rank'], 1)).to_pylist():
+                        best = best_by_duration.get(row['duration'])
+                        if best is None or row['total_interest'] < best['total_interest']:
+                            best_by_duration[row['duration']] = row
+    finally:
+        if writer is not None:
+            writer.close()
+    return best_by_duration
+
+
+def main(argv=None):
+    defaults = loan_calc.LoanSetup.from_config()
+    adjustment = loan_calc.RateAdjustment()
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--monthly-dec', default=str(adjustment.monthly_dec), help="Rate adjustment every 3 months, range or list")
+    parser.add_argument('--final-float-rate', default=str(adjustment.final_float_rate), help="Lowest float rate, range or list")
+    parser.add_argument('--duration', default=str(adjustment.duration), help="Simulation in months, range or list")
+    parser.add_argument('--discount', default=str(defaults.discount), help="Discount rate, range or list")
+    parser.add_argument('--principals', action='append', type=parse_principals,
+                        help="Comma separated principal of every part, repeat for several splits")
+    parser.add_argument('--rates', help="Comma separated rate types to include, all by default")
+    parser.add_argument('--top', type=int, default=1, help="Number of best splits kept per grid cell")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes, all cores by default")
+    parser.add_argument('--chunk-size', type=int, default=64, help="Grid cells per work item")
+    parser.add_argument('--output', default='sweep.parquet')
+    args = parser.parse_args(argv)
+
+    cells = list(itertools.product(
+        args.principals or [defaults.principals],
+        parse_values(args.discount),
+        parse_values(args.monthly_dec),
+        parse_values(args.final_float_rate),
+        parse_values(args.duration, int),
+    ))
+    rate_names = args.rates.split(',') if args.rates else None
+    print(f"Evaluating {len(cells)} grid cells on {args.workers or os.cpu_count()} workers")
+    best_by_duration = run_sweep(defaults, cells, args.output, rate_names, args.top, args.workers, args.chunk_size)
+    print(f"Results written to {args.output}")
+    for duration, row in sorted(best_by_duration.items()):
+        print(f"{duration} months: {row['total_interest']:.0f} kr with {row['scenario']} (discount on Part {row['discount_on']}), "
+              f"dec {row['monthly_dec']}, floor {row['final_float_rate']}, discount {row['discount']}, principals {row['principals']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BUCKET = 'test-bucket'
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """Client of a moto S3 holding an empty BUCKET behind common.storage, with the process-wide caches emptied."""
+    boto3 = pytest.importorskip('boto3')
+    moto = pytest.importorskip('moto')
+    from common import storage
+    from common.backends import S3Backend
+
+    for var, value in {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing',
+                       'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+        monkeypatch.setenv(var, value)
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        backend = S3Backend(client, BUCKET, ThreadPoolExecutor(max_workers=2))
+        monkeypatch.setattr(storage, 'get_backend', lambda bucket_name: backend)
+        for cache in (storage.get_df_cache()[0], storage.get_key_index()[0], storage.get_journal_state()[0]):
+            cache.clear()
+        yield client
+
+
+@pytest.fixture
+def bucket(s3):
+    return BUCKET
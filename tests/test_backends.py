@@ -0,0 +1,61 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from common.backends import CachedBackend, LocalBackend, NoSuchKey, NotModified, PreconditionFailed, S3Backend
+
+
+@pytest.fixture(params=['s3', 'cached_s3', 'local'])
+def backend(request, tmp_path):
+    if request.param == 'local':
+        return LocalBackend(str(tmp_path / 'bucket'))
+    s3 = request.getfixturevalue('s3')
+    backend = S3Backend(s3, request.getfixturevalue('bucket'), ThreadPoolExecutor(max_workers=4))
+    if request.param == 'cached_s3':
+        backend = CachedBackend(backend, str(tmp_path / 'cache'), 1024 * 1024)
+    return backend
+
+
+def test_put_and_get(backend):
+    etag, size, body = backend.put('a.csv', [b'x,y\n', b'1,2\n'], 'text/csv')
+    assert (size, body) == (8, b'x,y\n1,2\n')
+    obj = backend.get('a.csv')
+    assert obj.body.read() == body and obj.etag == etag
+    with pytest.raises(NotModified):
+        backend.get('a.csv', if_none_match=etag)
+    with pytest.raises(NoSuchKey):
+        backend.get('missing.csv')
+
+
+def test_conditional_puts(backend):
+    with pytest.raises(PreconditionFailed):
+        backend.put('a.csv', [b'1'], if_match='"nope"')
+    etag, _, _ = backend.put('a.csv', [b'1'], if_none_match='*')
+    with pytest.raises(PreconditionFailed):
+        backend.put('a.csv', [b'2'], if_none_match='*')
+    newer, _, _ = backend.put('a.csv', [b'2'], if_match=etag)
+    with pytest.raises(PreconditionFailed):
+        backend.put('a.csv', [b'3'], if_match=etag)
+    assert backend.get('a.csv').etag == newer
+
+
+def test_list_and_delete(backend):
+    for key in ('b.csv', 'a.csv', 't.journal/1.json', 't.journal/2.json'):
+        backend.put(key, [b'1'])
+    assert [info.key for info in backend.list()] == ['a.csv', 'b.csv']
+    assert [info.key for info in backend.list(delimiter=None)] == ['a.csv', 'b.csv', 't.journal/1.json', 't.journal/2.json']
+    assert [info.key for info in backend.list('t.journal/', None, 't.journal/1.json')] == ['t.journal/2.json']
+
+    backend.delete(['a.csv', 't.journal/1.json'])
+    assert [info.key for info in backend.list(delimiter=None)] == ['b.csv', 't.journal/2.json']
+
+
+def test_multipart_upload_round_trips(s3, bucket):
+    backend = S3Backend(s3, bucket, ThreadPoolExecutor(max_workers=4))
+    chunks = [bytes([value]) * (3 * 1024 * 1024) for value in range(7)]  # 21 MB, more than one batch of parts
+
+    etag, size, body = backend.put('big.csv', iter(chunks), 'text/csv')
+    assert size == 21 * 1024 * 1024 and body is None
+    assert etag.endswith('-3"')  # Three 8 MB parts
+    assert backend.get('big.csv').body.read() == b''.join(chunks)
+    assert s3.list_multipart_uploads(Bucket=bucket).get('Uploads', []) == []
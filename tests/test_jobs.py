@@ -0,0 +1,52 @@
+import threading
+
+from common import jobs
+
+
+def _blocker():
+    release = threading.Event()
+    return release, lambda: release.wait(5) and 'done'
+
+
+def test_same_inputs_share_one_job():
+    board = jobs.JobBoard(workers=1)
+    first = board.watch('a', 'grid', jobs.fingerprint(1, 2), lambda x: x * 2, 21)
+    second = board.watch('b', 'grid', jobs.fingerprint(1, 2), lambda x: x * 3, 21)
+    assert first is second and first.result(5) == 42
+    assert jobs.fingerprint(1, 2) != jobs.fingerprint(2, 1)
+
+
+def test_replaced_queued_job_is_cancelled_unless_someone_watches_it():
+    board = jobs.JobBoard(workers=1)
+    release, block = _blocker()
+    running = board.watch('a', 'busy', 'running', block)
+    queued = board.watch('a', 'grid', 'old', lambda: 'old')
+    shared = board.watch('b', 'grid', 'old', lambda: 'old')
+    assert shared is queued
+
+    board.watch('a', 'grid', 'new', lambda: 'new')
+    assert not queued.cancelled()  # b still watches it
+    board.watch('b', 'grid', 'new', lambda: 'new')
+    assert queued.cancelled() and 'old' not in board.jobs
+    release.set()
+    assert running.result(5) == 'done'
+
+
+def test_idle_watchers_are_forgotten(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(jobs.time, 'monotonic', lambda: clock[0])
+    board = jobs.JobBoard(workers=1, watcher_ttl=60)
+    release, block = _blocker()
+    board.watch('gone', 'busy', 'running', block)
+    queued = board.watch('gone', 'grid', 'old', lambda: 'old')
+
+    clock[0] = 30.0
+    board.watch('active', 'grid', 'new', lambda: 'new')
+    assert not queued.cancelled()
+    clock[0] = 61.0
+    board.watch('active', 'grid', 'new', lambda: 'new')
+    assert queued.cancelled()
+    assert all(watcher == 'active' for watcher, _ in board.watching)
+    assert set(board.last_seen) == {'active'}
+    assert 'gone' not in set().union(*board.watchers.values())
+    release.set()
@@ -0,0 +1,90 @@
+import pandas as pd
+
+from common import storage
+
+TABLE = 'expected_income'
+
+
+def _snapshot(bucket, df):
+    storage.save_df_to_s3(df, bucket, f'{TABLE}.parquet')
+
+
+def _fresh_load(bucket):
+    storage.get_df_cache()[0].clear()
+    return storage.load_journaled_table(bucket, TABLE)
+
+
+def _journal_keys(s3, bucket):
+    listed = s3.list_objects_v2(Bucket=bucket, Prefix=storage._journal_prefix(TABLE))
+    return [obj['Key'] for obj in listed.get('Contents', [])]
+
+
+def test_merge_applies_every_kind_of_delta(bucket):
+    _snapshot(bucket, pd.DataFrame({'salary': [30000, 25000], 'bonus': [1000, 0]}))
+    storage.append_to_journal(bucket, TABLE, 'upsert', row=0, values={'salary': '31000', 'bonus': '1000'})
+    storage.append_to_journal(bucket, TABLE, 'upsert', row=None, values={'salary': '5', 'bonus': ''})
+    storage.append_to_journal(bucket, TABLE, 'rename_columns', columns={'bonus': 'extra'})
+    storage.append_to_journal(bucket, TABLE, 'add_columns', columns=['misc'])
+
+    df = _fresh_load(bucket)
+    assert list(df.columns) == ['salary', 'extra', 'misc']
+    assert df['salary'].tolist() == [31000, 25000, 5]
+    assert df.attrs['column_totals'] == {'salary': 56005.0, 'extra': 1000.0}
+
+
+def test_compaction_round_trips(s3, bucket):
+    _snapshot(bucket, pd.DataFrame({'salary': [30000], 'bonus': [1000]}))
+    storage.append_to_journal(bucket, TABLE, 'upsert', row=None, values={'salary': '2000', 'bonus': '3'})
+    storage.append_to_journal(bucket, TABLE, 'drop_columns', columns=['bonus'])
+    merged = _fresh_load(bucket)
+
+    assert storage.compact_table(bucket, TABLE)
+    assert _journal_keys(s3, bucket) == []
+    compacted = _fresh_load(bucket)
+    pd.testing.assert_frame_equal(compacted, merged)
+    assert compacted.attrs['column_totals'] == {'salary': 32000.0}
+    assert not storage.compact_table(bucket, TABLE)
+
+
+def test_delta_sorting_before_a_compaction_is_not_lost(s3, bucket):
+    _snapshot(bucket, pd.DataFrame({'salary': [1]}))
+    storage.append_to_journal(bucket, TABLE, 'upsert', row=None, values={'salary': '2'})
+    storage.append_to_journal(bucket, TABLE, 'upsert', row=None, values={'salary': '3'})
+    storage.compact_table(bucket, TABLE)
+    # A slow PUT, or a writer whose clock lags, lands a key older than the ones just compacted
+    s3.put_object(Bucket=bucket, Key=f'{storage._journal_prefix(TABLE)}{0:020d}-late.json',
+                      Body=b'{"op": "upsert", "row": null, "values": {"salary": "4"}}')
+
+    assert _fresh_load(bucket)['salary'].tolist() == [1, 2, 3, 4]
+    assert storage.compact_table(bucket, TABLE)
+    assert _journal_keys(s3, bucket) == []
+    assert _fresh_load(bucket)['salary'].tolist() == [1, 2, 3, 4]
+
+
+def test_compaction_loses_to_a_newer_snapshot(s3, bucket, monkeypatch):
+    _snapshot(bucket, pd.DataFrame({'salary': [1]}))
+    storage.append_to_journal(bucket, TABLE, 'upsert', row=None, values={'salary': '2'})
+    merged = storage._merge_journal(bucket, TABLE)
+    _snapshot(bucket, pd.DataFrame({'salary': [7]}))
+    monkeypatch.setattr(storage, '_merge_journal', lambda bucket_name, name: merged)
+
+    assert not storage.compact_table(bucket, TABLE)
+    assert len(_journal_keys(s3, bucket)) == 1
+
+
+def test_compaction_loses_to_a_snapshot_swapped_in_after_the_read(s3, bucket, monkeypatch):
+    _snapshot(bucket, pd.DataFrame({'salary': [1]}))
+    storage.append_to_journal(bucket, TABLE, 'upsert', row=None, values={'salary': '2'})
+    read_table = storage._read_table
+
+    def read_then_swap(bucket_name, name):
+        read = read_table(bucket_name, name)
+        # Another session writes a newer snapshot, which lands in the cache before this compaction puts
+        _snapshot(bucket, pd.DataFrame({'salary': [7]}))
+        return read
+    monkeypatch.setattr(storage, '_read_table', read_then_swap)
+
+    assert not storage.compact_table(bucket, TABLE)
+    monkeypatch.setattr(storage, '_read_table', read_table)
+    assert len(_journal_keys(s3, bucket)) == 1
+    assert _fresh_load(bucket)['salary'].tolist() == [7, 2]
@@ -0,0 +1,62 @@
+from common import storage
+
+
+def _put(s3, bucket, key, body=b'a,b\n1,2\n'):
+    s3.put_object(Bucket=bucket, Key=key, Body=body)
+
+
+def test_listing_pages_past_1000_keys(s3, bucket):
+    keys = [f'file_{i:04d}.csv' for i in range(2345)]
+    for key in keys:
+        _put(s3, bucket, key)
+
+    assert [info.key for info in storage.iter_objects(bucket)] == keys
+    assert [info.key for info in storage.list_objects_indexed(bucket, suffix='.csv')] == keys
+    assert [info.key for info in storage.iter_objects(bucket, start_after=keys[1499])] == keys[1500:]
+
+
+def test_listing_includes_nested_keys_but_not_journals(s3, bucket):
+    _put(s3, bucket, 'top.csv')
+    _put(s3, bucket, 'sub/x.csv')
+    storage.append_to_journal(bucket, 'expected_income', 'add_columns', columns=['misc'])
+
+    assert [info.key for info in storage.list_objects_indexed(bucket, suffix='.csv')] == ['sub/x.csv', 'top.csv']
+    assert [info.key for info in storage.list_objects_indexed(bucket, delimiter='/')] == ['top.csv']
+
+
+def test_index_follows_our_writes_until_refreshed(s3, bucket):
+    _put(s3, bucket, 'a.csv')
+    assert [info.key for info in storage.list_objects_indexed(bucket, suffix='.csv')] == ['a.csv']
+
+    storage.add_csv_to_s3(bucket, 'b.csv', 'x\n1\n')
+    _put(s3, bucket, 'c.csv')  # Written behind the index's back
+    assert [info.key for info in storage.list_objects_indexed(bucket, suffix='.csv')] == ['a.csv', 'b.csv']
+    assert [info.key for info in storage.list_objects_indexed(bucket, suffix='.csv', refresh=True)] == \
+        ['a.csv', 'b.csv', 'c.csv']
+
+
+def test_expired_index_only_lists_the_keys_after_its_last_one(s3, bucket, monkeypatch):
+    _put(s3, bucket, 'a.csv')
+    _put(s3, bucket, 'c.csv')
+    assert [info.key for info in storage.list_objects_indexed(bucket)] == ['a.csv', 'c.csv']
+    _put(s3, bucket, 'b.csv')
+    _put(s3, bucket, 'd.csv')
+
+    monkeypatch.setattr(storage, 'KEY_INDEX_TTL', -1)
+    starts = []
+    iter_objects = storage.iter_objects
+    monkeypatch.setattr(storage, 'iter_objects', lambda *args: starts.append(args[3]) or iter_objects(*args))
+    assert [info.key for info in storage.list_objects_indexed(bucket)] == ['a.csv', 'c.csv', 'd.csv']
+    assert starts == ['c.csv']
+    assert [info.key for info in storage.list_objects_indexed(bucket, refresh=True)] == ['a.csv', 'b.csv', 'c.csv', 'd.csv']
+
+
+def test_listing_skips_a_journal_with_one_request(s3, bucket):
+    journal = storage._journal_prefix('expected_income')
+    for key in ['a.csv', 'expected_income.parquet', 'z.csv'] + [f'{journal}{i:020d}.json' for i in range(1100)]:
+        _put(s3, bucket, key)
+    requests = []
+    s3.meta.events.register('provide-client-params.s3.ListObjectsV2', lambda params, **kwargs: requests.append(dict(params)))
+
+    assert [info.key for info in storage.list_objects_indexed(bucket)] == ['a.csv', 'expected_income.parquet', 'z.csv']
+    assert [params.get('StartAfter') for params in requests] == [None, f'{journal}\U0010ffff']
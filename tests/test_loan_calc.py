@@ -0,0 +1,210 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from common import loan_calc
+
+SETUP = loan_calc.LoanSetup.from_config()
+DEFAULT = loan_calc.RateAdjustment(monthly_dec=0.25, final_float_rate=3.0, duration=18)
+# The float rate falls to 0 within a year, further than the fixed rates sit below it
+STEEP_FALL = loan_calc.RateAdjustment(monthly_dec=1.5, final_float_rate=0.0, duration=18)
+
+
+@pytest.mark.parametrize('n_parts', [1, 2, 3])
+def test_combination_interests_match_the_product_loop(n_parts):
+    names, values = SETUP.rate_table()
+    principals = SETUP.principals[:n_parts]
+    expected, labels = [], []
+    for combo in itertools.product(range(len(values)), repeat=n_parts):
+        for discounted_part in range(n_parts):
+            rates = [values[code] - SETUP.discount if part == discounted_part else values[code]
+                     for part, code in enumerate(combo)]
+            expected.append(sum(loan_calc.compute_monthly_interest(amount, rate) for amount, rate in zip(principals, rates)))
+            labels.append(", ".join(f"Part {part+1}: {names[code]} @ {rate:.2f}%"
+                                    for part, (code, rate) in enumerate(zip(combo, rates))))
+
+    interests = loan_calc.compute_combination_interests(principals, values, SETUP.discount)
+    np.testing.assert_allclose(interests, expected, rtol=1e-12)
+    assert [loan_calc.describe_combination(index, n_parts, names, values, SETUP.discount)
+            for index in range(len(interests))] == labels
+
+
+def _baseline_rates_over_time(rate_type, initial_rate, duration, final_float_rate, monthly_dec):
+    """compute_rates_over_time as it was before the closed form."""
+    rates_over_time = []
+    current_rate = initial_rate
+    if rate_type.startswith("float"):
+        for _ in range(0, duration, 3):
+            if current_rate > final_float_rate:
+                current_rate = max(current_rate - monthly_dec, final_float_rate)
+            rates_over_time.append(current_rate)
+    else:
+        rates_over_time = [current_rate] * (duration // 3)
+    return rates_over_time
+
+
+def _baseline_total_interest(mortgage_parts, rates, discount, float_rate, monthly_dec, final_float_rate, duration):
+    """compute_total_interest_and_final_rates as it was before the batched simulator, quarter by quarter."""
+    total_interest, final_rates, detailed_interests = 0, [], []
+    for amount, (rate_type, rate, is_discounted) in zip(mortgage_parts, rates):
+        monthly_interests = []
+        if rate_type.startswith("float"):
+            for monthly_rate in _baseline_rates_over_time(rate_type, rate, duration, final_float_rate, monthly_dec):
+                if is_discounted:
+                    monthly_rate = max(0.05, monthly_rate - discount)
+                interest = loan_calc.calculate_interest_payment(amount, monthly_rate, 3)
+                total_interest += interest
+                monthly_interests.append((monthly_rate, interest))
+            final_rates.append(f"{monthly_rate:.2f}%")
+        else:
+            fixed_duration = int(rate_type.split('_')[1]) * 12
+            current_rate = max(0.05, rate - discount) if is_discounted else rate
+            interest = loan_calc.calculate_interest_payment(amount, current_rate, fixed_duration)
+            total_interest += interest
+            monthly_interests.append((current_rate, interest))
+            if duration > fixed_duration:
+                current_float_rate = _baseline_rates_over_time("float", float_rate, fixed_duration, final_float_rate, monthly_dec)[-1]
+                for monthly_rate in _baseline_rates_over_time("float", current_float_rate, duration - fixed_duration,
+                                                              final_float_rate, monthly_dec):
+                    if is_discounted:
+                        monthly_rate = max(0.05, monthly_rate - discount)
+                    interest = loan_calc.calculate_interest_payment(amount, monthly_rate, 3)
+                    total_interest += interest
+                    monthly_interests.append((monthly_rate, interest))
+                final_rates.append(f"{monthly_rate:.2f}%")
+            else:
+                final_rates.append(f"{rate:.2f}%")
+        detailed_interests.append(monthly_interests)
+    return total_interest, ", ".join(final_rates), detailed_interests
+
+
+@pytest.mark.parametrize('adjustment', [
+    loan_calc.RateAdjustment(0.25, 3.0, 24),
+    loan_calc.RateAdjustment(0.25, 3.0, 60),
+    loan_calc.RateAdjustment(0.5, 4.5, 48),
+    loan_calc.RateAdjustment(0.1, 1.0, 12),
+])
+def test_simulate_scenario_matches_the_quarterly_loop(adjustment):
+    names, values = SETUP.rate_table()
+    codes, discounted = loan_calc.enumerate_discount_scenarios(len(SETUP.principals), len(names))
+    for split, flags in zip(codes, discounted):
+        rates = list(zip(names[split].tolist(), values[split].tolist(), flags.tolist()))
+        total, description, final_rates, detailed = loan_calc.simulate_scenario(SETUP, rates, adjustment)
+        expected_total, expected_final_rates, expected_detailed = _baseline_total_interest(
+            SETUP.principals, rates, SETUP.discount, SETUP.float_rate, *adjustment)
+
+        assert total == pytest.approx(expected_total, rel=1e-12)
+        assert description == loan_calc.describe_scenario(rates)
+        assert final_rates == expected_final_rates
+        for part, expected_part in zip(detailed, expected_detailed):
+            assert np.asarray(part, dtype=float) == pytest.approx(np.asarray(expected_part, dtype=float), rel=1e-12)
+
+
+@pytest.mark.parametrize('duration', [3, 24, 120])
+def test_rates_over_time_match_the_quarterly_loop(duration):
+    for rate_type, rate in SETUP.base_rates + (('float', 2.0),):
+        assert loan_calc.compute_rates_over_time(rate_type, rate, duration, 3.0, 0.25) == \
+            pytest.approx(_baseline_rates_over_time(rate_type, rate, duration, 3.0, 0.25))
+
+
+def _brute_force_splits(part_costs, discounted_costs):
+    """Every split in compute_combination_interests order, sorted by total and stable on ties."""
+    codes, discounted = loan_calc.enumerate_discount_scenarios(*part_costs.shape)
+    parts = np.arange(part_costs.shape[0])
+    totals = np.where(discounted, discounted_costs[parts, codes], part_costs[parts, codes]).sum(axis=1)
+    order = np.argsort(totals, kind='stable')
+    return codes[order], discounted.argmax(axis=1)[order], totals[order]
+
+
+@pytest.mark.parametrize('n_parts, n_rates, k', [(1, 3, 2), (3, 4, 10), (4, 5, 40), (5, 3, 1000)])
+def test_top_k_splits_matches_brute_force(n_parts, n_rates, k):
+    # Small integer costs make the sums exact and full of ties, which must break in enumeration order
+    rng = np.random.default_rng(n_parts * n_rates)
+    part_costs = rng.integers(5, 15, (n_parts, n_rates)).astype(float)
+    discounted_costs = part_costs - rng.integers(0, 5, (n_parts, n_rates))
+
+    codes, discounted_part, totals = loan_calc.top_k_splits(part_costs, discounted_costs, k)
+    expected_codes, expected_part, expected_totals = _brute_force_splits(part_costs, discounted_costs)
+    np.testing.assert_array_equal(codes, expected_codes[:k])
+    np.testing.assert_array_equal(discounted_part, expected_part[:k])
+    np.testing.assert_array_equal(totals, expected_totals[:k])
+
+
+@pytest.mark.parametrize('n_parts, n_rates', [(3, 0), (0, 4)])
+def test_top_k_splits_without_rates_or_parts_is_empty(n_parts, n_rates):
+    codes, discounted_part, totals = loan_calc.top_k_splits(np.zeros((n_parts, n_rates)), np.zeros((n_parts, n_rates)), 5)
+    assert codes.shape == (0, n_parts) and len(discounted_part) == len(totals) == 0
+    assert len(loan_calc.best_monthly_splits(SETUP, 5, [])[2]) == 0
+
+
+def test_best_monthly_splits_match_the_grid():
+    names, values = SETUP.rate_table()
+    interests = loan_calc.compute_combination_interests(SETUP.principals, values, SETUP.discount)
+    codes, discounted_part, totals = loan_calc.best_monthly_splits(SETUP, 20)
+
+    np.testing.assert_allclose(totals, np.sort(interests)[:20], rtol=1e-12)
+    indices = [loan_calc.combination_index(split, len(values), part) for split, part in zip(codes, discounted_part)]
+    np.testing.assert_allclose(interests[indices], totals, rtol=1e-12)
+
+
+def _brute_force_plan_costs(setup, adjustment, minimum_discounted_rate=0.05):
+    """Cheapest cost of every (part, discounted) pair over every sequence of products, tried one by one."""
+    names, values = setup.rate_table()
+    n_quarters = len(range(0, adjustment.duration, 3))
+    terms = [loan_calc.fixed_term_months(name) // 3 for name in names]
+    balances = loan_calc.amortized_balances(np.asarray(setup.principals, dtype=float), setup.amort_rates or 0,
+                                            3 * (n_quarters + max(terms)))
+
+    def offered(product, quarter, discounted):
+        if terms[product]:
+            move = loan_calc.float_rate_at(setup.float_rate, quarter, adjustment.final_float_rate,
+                                           adjustment.monthly_dec) - setup.float_rate
+            rate = max(values[product] + move, minimum_discounted_rate)
+        else:
+            rate = loan_calc.float_rate_at(values[product], quarter + 1, adjustment.final_float_rate,
+                                           adjustment.monthly_dec)
+        return max(rate - setup.discount, minimum_discounted_rate) if discounted else rate
+
+    def cheapest(part, quarter, discounted):
+        if quarter >= n_quarters:
+            return 0.0
+        costs = []
+        for product in range(len(names)):
+            length = terms[product] or 1
+            months = balances[part, 3 * quarter:3 * (quarter + length)].sum()
+            costs.append(months * offered(product, quarter, discounted) / 100 / 12
+                         + cheapest(part, quarter + length, discounted))
+        return min(costs)
+
+    return np.array([[cheapest(part, 0, discounted) for discounted in (False, True)]
+                     for part in range(len(setup.principals))])
+
+
+@pytest.mark.parametrize('adjustment', [DEFAULT, STEEP_FALL])
+@pytest.mark.parametrize('amort_rates', [(), (2.0, 1.0, 3.0)])
+def test_plan_refixing_matches_brute_force(adjustment, amort_rates):
+    setup = SETUP._replace(amort_rates=amort_rates)
+    discounted_part, plans, part_costs, total = loan_calc.plan_refixing(setup, adjustment)
+
+    costs = _brute_force_plan_costs(setup, adjustment)
+    totals = [costs[:, 0].sum() - costs[part, 0] + costs[part, 1] for part in range(len(costs))]
+    assert total == pytest.approx(min(totals))
+    assert part_costs == pytest.approx(np.where(np.arange(len(costs)) == discounted_part, costs[:, 1], costs[:, 0]))
+    n_quarters = len(range(0, adjustment.duration, 3))
+    for plan in plans:
+        assert plan[0][0] == 0 and plan[-1][1] == n_quarters
+        assert all(end == start for (_, end, _, _), (start, _, _, _) in zip(plan, plan[1:]))
+
+
+def test_plan_refixing_never_offers_negative_rates():
+    _, plans, part_costs, total = loan_calc.plan_refixing(SETUP, STEEP_FALL._replace(duration=36))
+    assert all(rate >= 0.05 for plan in plans for _, _, _, rate in plan)
+    assert (part_costs > 0).all() and total > 0
+
+
+def test_plan_refixing_without_rates_or_parts_is_empty():
+    discounted_part, plans, part_costs, total = loan_calc.plan_refixing(SETUP, DEFAULT, [])
+    assert (discounted_part, plans, total) == (-1, [[], [], []], 0.0)
+    np.testing.assert_array_equal(part_costs, np.zeros(3))
+    assert loan_calc.plan_refixing(SETUP._replace(principals=()), DEFAULT)[:2] == (-1, [])
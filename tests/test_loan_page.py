@@ -0,0 +1,47 @@
+import os
+
+from common import loan_calc
+
+PAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sources', 'Loan_selector.py')
+
+
+def _run_page(loan):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(PAGE, default_timeout=120)
+    at.session_state['loan'] = loan
+    at.run()
+    assert not at.exception
+    return at
+
+
+def test_small_grid_is_plotted_with_labels():
+    at = _run_page(loan_calc.LoanSetup.from_config())
+    assert not [slider for slider in at.slider if slider.key == 'plot_range']
+
+
+def test_large_grid_is_downsampled():
+    # 12 rate types on 3 parts make 12 ** 3 * 3 = 5184 scenarios, above HOVER_LABEL_LIMIT
+    rates = [('float', 4.65)] + [(f'fixed_{years}_year', 4.6 - 0.05 * years) for years in range(1, 12)]
+    loan = loan_calc.LoanSetup.from_config()._replace(base_rates=tuple(rates))
+    at = _run_page(loan)
+
+    plot_range = at.slider(key='plot_range')
+    assert plot_range.value == (0, 5183)
+    inspected = at.number_input(key='inspect_combination')
+    names, values = loan.rate_table()
+    best = loan_calc.describe_combination(inspected.value, 3, names, values, loan.discount)
+    assert any(markdown.value.startswith(best) for markdown in at.markdown)
+
+    plot_range.set_value((100, 200)).run()
+    assert not at.exception
+    assert any(caption.value.startswith('101 of 101 combinations drawn') for caption in at.caption)
+
+
+def test_empty_rate_selections_skip_the_computations():
+    at = _run_page(loan_calc.LoanSetup.from_config())
+    for multiselect in at.multiselect:
+        multiselect.set_value([])
+    at.run()
+    assert not at.exception
+    assert sum(info.value.startswith('Select at least one rate') for info in at.info) == 2
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from common import loan_calc, monte_carlo
+
+SETUP = loan_calc.LoanSetup.from_config()
+ADJUSTMENT = loan_calc.RateAdjustment(monthly_dec=0.25, final_float_rate=3.0, duration=24)
+
+
+def _splits(setup):
+    names, values = setup.rate_table()
+    codes, discounted = loan_calc.enumerate_discount_scenarios(len(setup.principals), len(names))
+    return names, values, codes, discounted
+
+
+@pytest.mark.parametrize('amort_rates', [(), (2.0, 1.0, 3.0)])
+def test_random_walk_without_volatility_is_the_deterministic_model(amort_rates):
+    setup = SETUP._replace(amort_rates=amort_rates)
+    names, values, codes, discounted = _splits(setup)
+    stochastic = monte_carlo.StochasticRates(volatility=0.0, n_paths=3, chunk_size=2)
+
+    results = monte_carlo.evaluate_splits(setup, ADJUSTMENT, stochastic, codes, discounted)
+
+    expected = [loan_calc.simulate_scenario(setup, list(zip(names[split], values[split], flags)), ADJUSTMENT)[0]
+                for split, flags in zip(codes, discounted)]
+    np.testing.assert_allclose(results['mean'], expected, rtol=1e-6)
+    np.testing.assert_allclose(results['percentiles'][:, 0], expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize('model', monte_carlo.MODELS)
+def test_paths_do_not_depend_on_the_chunk_size(model):
+    stochastic = monte_carlo.StochasticRates(model=model, n_paths=10, chunk_size=10)
+    whole = np.concatenate(list(monte_carlo.simulate_float_paths(4.65, ADJUSTMENT, stochastic)))
+    chunked = np.concatenate(list(monte_carlo.simulate_float_paths(4.65, ADJUSTMENT, stochastic._replace(chunk_size=3))))
+    np.testing.assert_array_equal(whole, chunked)
+    assert whole.shape == (10, 8) and (whole >= 0).all()
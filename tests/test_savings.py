@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+import pytest
+
+from common import savings, storage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _history(bucket):
+    storage.get_df_cache()[0].clear()
+    return storage.load_journaled_table(bucket, savings.HISTORY_TABLE)
+
+
+def test_parse_amounts():
+    amounts, invalid = savings.parse_amounts({'rent': '10 000', 'food': '12,5', 'misc': '', 'car': 'abc'})
+    assert amounts == {'rent': 10000, 'food': 12.5, 'misc': None}
+    assert invalid == ['car']
+
+
+def test_record_month_replaces_the_month_and_fills_skipped_ones(bucket):
+    history = savings.record_month(bucket, pd.DataFrame(), '2026-01', 30000, 20000)
+    history = savings.record_month(bucket, history, '2026-01', 31000, 20000)
+    assert savings.record_month(bucket, history, '2026-01', 31000, 20000) is history
+    history = savings.record_month(bucket, history, '2026-04', 31000, 25000)
+
+    stored = _history(bucket)
+    assert stored['month'].tolist() == history['month'].tolist() == ['2026-01', '2026-02', '2026-03', '2026-04']
+    assert stored['savings'].tolist() == [11000, 11000, 11000, 6000]
+    assert stored['cumulative_savings'].tolist() == [11000, 22000, 33000, 39000]
+    assert savings.record_month(bucket, stored, '2025-12', 0, 0) is stored
+
+
+def test_record_totals_reads_the_tables(bucket):
+    storage.save_df_to_s3(pd.DataFrame({'salary': [30000, 5000]}), bucket, f'{savings.INCOME_TABLE}.parquet')
+    storage.save_df_to_s3(pd.DataFrame({'rent': [10000], 'food': [4000]}), bucket, f'{savings.EXPENSES_TABLE}.parquet')
+    storage.append_to_journal(bucket, savings.EXPENSES_TABLE, 'upsert', row=0, values={'rent': 12000})
+
+    savings.record_totals(bucket, '2026-05')
+    assert _history(bucket)[['income', 'expenses', 'savings']].values.tolist() == [[35000, 16000, 19000]]
+
+
+@pytest.mark.parametrize('first, last, expected', [
+    ('2026-01', '2026-03', 6.0),
+    ('2026-02', '2026-02', 2.0),
+    ('2025-01', '2025-12', 0.0),
+    # Months after the last row keep its savings
+    ('2026-02', '2026-05', 2.0 + 3.0 * 3),
+    ('2026-06', '2026-07', 6.0),
+    ('2026-07', '2026-06', 0.0),
+])
+def test_savings_between(first, last, expected):
+    history = pd.DataFrame({'month': ['2026-01', '2026-02', '2026-03'], 'savings': [1.0, 2.0, 3.0],
+                            'cumulative_savings': [1.0, 3.0, 6.0]})
+    assert savings.savings_between(history, first, last) == expected
+
+
+def test_sessions_recording_a_new_month_at_once_write_it_once(bucket):
+    savings.record_month(bucket, pd.DataFrame(), '2026-05', 30000, 20000)
+    savings.record_month(bucket, pd.DataFrame(), '2026-05', 30000, 20000)
+    assert _history(bucket)['month'].tolist() == ['2026-05']
+
+
+def test_page_starts_an_empty_history_with_the_current_totals(bucket):
+    from streamlit.testing.v1 import AppTest
+
+    storage.save_df_to_s3(pd.DataFrame({'salary': [30000]}), bucket, f'{savings.INCOME_TABLE}.parquet')
+    storage.save_df_to_s3(pd.DataFrame({'rent': [12000]}), bucket, f'{savings.EXPENSES_TABLE}.parquet')
+    at = AppTest.from_file(os.path.join(ROOT, 'sources', 'expected_savings.py'), default_timeout=60).run()
+    assert not at.exception
+
+    this_month = str(pd.Timestamp.now().to_period('M'))
+    assert _history(bucket)[['month', 'savings']].values.tolist() == [[this_month, 18000]]
+    assert at.metric[0].value == '18,000 kr'
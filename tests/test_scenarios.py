@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from common import loan_calc
+from common.scenarios import ScenarioStore, downsample_minmax
+
+
+@pytest.mark.parametrize('n_values, n_buckets', [(10, 5), (11, 3), (1000, 7), (100_003, 2000)])
+def test_downsample_minmax_keeps_the_envelope(n_values, n_buckets):
+    values = np.random.default_rng(n_values).normal(size=n_values)
+    index = downsample_minmax(values, n_buckets)
+
+    assert len(index) <= 2 * n_buckets
+    assert (np.diff(index) > 0).all()
+    size = max(-(-n_values // n_buckets), 1)
+    for start in range(0, n_values, size):
+        run = values[start:start + size]
+        kept = values[index[(index >= start) & (index < start + size)]]
+        if len(values) > 2 * n_buckets:
+            assert kept.min() == run.min() and kept.max() == run.max()
+    assert values[index].min() == values.min() and values[index].max() == values.max()
+
+
+def test_downsample_minmax_includes_the_tail_bucket():
+    values = np.zeros(103)
+    values[-1] = 5.0
+    index = downsample_minmax(values, 10)
+    assert index[-1] == 102 and len(index) <= 2 * 10
+
+
+def test_downsample_minmax_keeps_short_series_whole():
+    np.testing.assert_array_equal(downsample_minmax(np.arange(8.0), 4), np.arange(8))
+
+
+def test_store_top_and_labels_match_the_grid():
+    setup = loan_calc.LoanSetup.from_config()
+    names, values = setup.rate_table()
+    interests = loan_calc.compute_combination_interests(setup.principals, values, setup.discount)
+    store = ScenarioStore.enumerate(len(setup.principals), names, values, setup.discount, monthly_interest=interests)
+
+    assert store.n_scenarios == len(interests) == 4 ** 3 * 3
+    np.testing.assert_array_equal(store.top('monthly_interest', 10), np.argsort(interests, kind='stable')[:10])
+    assert store.labels([0, 37, 191]) == [loan_calc.describe_combination(index, 3, names, values, setup.discount)
+                                          for index in (0, 37, 191)]
+
+
+def test_store_to_arrow_round_trips():
+    pa = pytest.importorskip('pyarrow')
+    store = ScenarioStore.enumerate(2, ['float', 'fixed_1_year'], [4.65, 4.54], 2.15,
+                                    total=np.arange(8, dtype=float))
+    table = pa.ipc.open_file(pa.BufferReader(store.to_arrow_ipc())).read_all()
+
+    assert table.column('part_1_rate').to_pylist() == ['float'] * 4 + ['fixed_1_year'] * 4
+    assert table.column('discount_on').to_pylist() == [1, 2] * 4
+    assert table.column('total').to_pylist() == list(range(8))
+    assert table.schema.metadata[b'discount'] == b'2.15'
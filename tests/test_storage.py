@@ -0,0 +1,16 @@
+import numpy as np
+import pandas as pd
+
+from common import storage
+
+
+def test_large_csv_round_trips_plain_and_gzipped(s3, bucket):
+    rows = 800_000  # About 10 MB of CSV, sent as a multipart upload unless gzipped
+    df = pd.DataFrame({'amount': np.arange(rows), 'name': np.random.default_rng(0).choice(['rent', 'food'], rows)})
+    storage.save_df_to_s3(df, bucket, 'big.csv')
+    storage.save_df_to_s3(df, bucket, 'big_gz.csv', compress=True)
+
+    assert s3.head_object(Bucket=bucket, Key='big_gz.csv')['ContentEncoding'] == 'gzip'
+    for key in ('big.csv', 'big_gz.csv'):
+        storage.get_df_cache()[0].clear()
+        pd.testing.assert_frame_equal(storage.load_df_from_s3(bucket, key), df)